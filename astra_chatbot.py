@@ -1,5 +1,6 @@
 import os
 import sys
+import html
 import json
 import time
 from datetime import datetime
@@ -16,8 +17,7 @@ if "QT_QPA_PLATFORM" not in os.environ:
     else:
         os.environ["QT_QPA_PLATFORM"] = "xcb"
 
-import httpx
-from PySide6.QtCore import QThread, Signal, Qt, QObject
+from PySide6.QtCore import QThread, Signal, Qt, QObject, QTimer
 from PySide6.QtGui import QTextCursor, QFont, QScreen, QIcon
 from PySide6.QtWidgets import (
     QApplication,
@@ -35,9 +35,10 @@ from PySide6.QtWidgets import (
     QFrame,
 )
 
+import ollama_client
 from command_executor import CommandExecutor
+from ollama_client import OLLAMA_API
 
-OLLAMA_API = os.environ.get("OLLAMA_API", "http://localhost:11434")
 DEFAULT_MODEL = os.environ.get("ASTRA_CHATBOT_MODEL", "qwen2.5:0.5b")
 SYSTEM_PROMPT = os.environ.get("ASTRA_CHATBOT_SYSTEM")
 
@@ -46,36 +47,30 @@ SESSIONS_DIR.mkdir(parents=True, exist_ok=True)
 
 # Initialize command executor with PDF
 PDF_PATH = Path(__file__).parent / "ubuntu-linux-toolbox-1000-commands-for-ubuntu-and-debian-power-users-9780470082935-2007041567-076456997x.pdf"
+# Optional directory of extra sources (man pages, /usr/share/doc content, runbooks)
+KB_SOURCES_DIR = os.environ.get("ASTRA_CHATBOT_KB_DIR")
 COMMAND_EXECUTOR = None
 
+# Command output reaches the transcript in batches, and only this many lines per command run
+OUTPUT_FLUSH_MS = 100
+MAX_OUTPUT_LINES = 200
+
 def init_command_executor():
     """Initialize command executor in background"""
     global COMMAND_EXECUTOR
-    if PDF_PATH.exists():
+    if PDF_PATH.exists() or KB_SOURCES_DIR:
         print("🔧 Initializing command executor with Ubuntu Linux Toolbox...")
-        COMMAND_EXECUTOR = CommandExecutor(str(PDF_PATH))
+        COMMAND_EXECUTOR = CommandExecutor(str(PDF_PATH), KB_SOURCES_DIR)
         print("✅ Command executor ready!")
     else:
         print(f"⚠️  PDF not found at {PDF_PATH}")
 
 def ensure_api_available() -> bool:
-    try:
-        with httpx.Client(timeout=5.0) as client:
-            r = client.get(f"{OLLAMA_API}/api/tags")
-            return r.status_code == 200
-    except Exception:
-        return False
+    return ollama_client.is_available()
 
 
 def list_models() -> list[str]:
-    try:
-        with httpx.Client(timeout=5.0) as client:
-            r = client.get(f"{OLLAMA_API}/api/tags")
-            r.raise_for_status()
-            tags = r.json().get("models", [])
-            return [m.get("name") for m in tags if m.get("name")]
-    except Exception:
-        return []
+    return ollama_client.list_models()
 
 
 def save_turn(session_path: Path, role: str, content: str) -> None:
@@ -127,6 +122,10 @@ class CommandWorker(QThread):
     def __init__(self, request: str):
         super().__init__()
         self.request = request
+        self._lock = threading.Lock()
+        self._pending: list[str] = []
+        self._shown: dict[str, int] = {}  # Output lines forwarded per command tag ("[n]")
+        self._cut: dict[str, int] = {}  # Lines dropped past MAX_OUTPUT_LINES per command tag
     
     def run(self):
         try:
@@ -136,7 +135,14 @@ class CommandWorker(QThread):
                 return
             
             self.progress.emit(f"🤖 Processing: {self.request}")
-            report = COMMAND_EXECUTOR.execute_with_retry(self.request)
+            # Command output is collected by on_output and shown in batches (take_output)
+            report = COMMAND_EXECUTOR.execute_with_retry(self.request, on_output=self.on_output)
+            with self._lock:
+                for tag in list(self._cut):
+                    self._end_command(tag)
+            output = self.take_output()
+            if output:
+                self.progress.emit(output)
             
             # Send progress updates
             for attempt in report.get("attempts", []):
@@ -148,6 +154,33 @@ class CommandWorker(QThread):
         except Exception as e:
             self.progress.emit(f"❌ Error: {str(e)}")
             self.done.emit({"final_status": "failed", "summary": str(e)})
+    
+    def on_output(self, line: str):
+        """Queue an output line (called from the command's reader threads)"""
+        tag, _, text = line.partition(" ") if line.startswith("[") else ("", "", line)
+        with self._lock:
+            if text.startswith("$ "):
+                # A new command run (or retry) under this tag
+                self._end_command(tag)
+                self._shown[tag] = 0
+            elif self._shown.get(tag, 0) >= MAX_OUTPUT_LINES:
+                self._cut[tag] = self._cut.get(tag, 0) + 1
+                return
+            else:
+                self._shown[tag] = self._shown.get(tag, 0) + 1
+            self._pending.append(html.escape(line))
+    
+    def _end_command(self, tag: str):
+        # Caller holds the lock
+        cut = self._cut.pop(tag, 0)
+        if cut:
+            self._pending.append(html.escape(f"{tag} ... {cut} more lines of output not shown".lstrip()))
+    
+    def take_output(self) -> str:
+        """Output lines queued since the last call, as one transcript entry (HTML), or ''"""
+        with self._lock:
+            lines, self._pending = self._pending, []
+        return "<br>".join(lines)
 
 
 class ChatWorker(QThread):
@@ -163,26 +196,12 @@ class ChatWorker(QThread):
     def run(self) -> None:
         try:
             assistant_text = ""
-            with httpx.Client(timeout=None) as client:
-                with client.stream(
-                    "POST",
-                    f"{OLLAMA_API}/api/chat",
-                    json={"model": self.model, "messages": self.messages, "stream": True},
-                ) as r:
-                    for line in r.iter_lines():
-                        if not line:
-                            continue
-                        try:
-                            data = json.loads(line)
-                        except Exception:
-                            continue
-                        msg = data.get("message") or {}
-                        chunk = msg.get("content", "")
-                        if chunk:
-                            assistant_text += chunk
-                            self.chunk.emit(chunk)
-                        if data.get("done"):
-                            break
+            for data in ollama_client.chat_stream(self.model, self.messages):
+                msg = data.get("message") or {}
+                chunk = msg.get("content", "")
+                if chunk:
+                    assistant_text += chunk
+                    self.chunk.emit(chunk)
             self.done.emit(assistant_text)
         except Exception as e:
             self.error.emit(str(e))
@@ -218,6 +237,8 @@ class ChatWindow(QWidget):
         self.sessions_list: list[dict] = []
         self.dark_mode_enabled = True
         self.command_worker = None
+        self.output_timer = QTimer(self)
+        self.output_timer.timeout.connect(self.on_output_timer)
 
         # Main layout with sidebar
         main_layout = QHBoxLayout()
@@ -453,6 +474,7 @@ class ChatWindow(QWidget):
         self.command_worker = CommandWorker(request)
         self.command_worker.progress.connect(self.on_command_progress)
         self.command_worker.done.connect(self.on_command_done)
+        self.output_timer.start(OUTPUT_FLUSH_MS)
         self.command_worker.start()
     
     def on_command_progress(self, message: str):
@@ -460,8 +482,15 @@ class ChatWindow(QWidget):
         self.transcript.append(f"<i>{message}</i>")
         QApplication.processEvents()
     
+    def on_output_timer(self):
+        """Show the command output collected since the last tick"""
+        output = self.command_worker.take_output()
+        if output:
+            self.on_command_progress(output)
+    
     def on_command_done(self, report: dict):
         """Handle command execution completion"""
+        self.output_timer.stop()
         summary = COMMAND_EXECUTOR.get_summary(report) if COMMAND_EXECUTOR else str(report)
         
         self.transcript.append(f"\n<b>Assistant:</b>\n{summary}")
@@ -802,6 +831,7 @@ def main(argv: list[str]) -> int:
     init_thread.start()
     
     app = QApplication(sys.argv)
+    app.aboutToQuit.connect(ollama_client.close_client)
     # Apply initial style (dark by default, like ChatGPT)
     app.setStyleSheet(get_styles(dark=True))
     w = ChatWindow()
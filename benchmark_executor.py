@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+Executor benchmark - end-to-end throughput and tail latency of CommandExecutor and the chat stream
+
+Starts mock_ollama.py with scripted replies and fixed latency/token rate, then
+drives execute_with_retry through success, multi-command, fix-up retry,
+unrecoverable and malformed-output scenarios, and the chat stream the way
+ChatWorker reads it. Commands really run, so scenarios only use harmless
+ones (echo, uname, cat of a missing file). Prints a JSON report: per scenario
+requests/s, p50/p95/p99 latency, LLM calls per request and how many requests
+ended with the expected status; for chat, time to first token and tokens/s.
+
+    python benchmark_executor.py --output bench.json
+    python benchmark_executor.py --latency 0.2 --token-rate 60 --concurrency 4
+    python benchmark_executor.py --baseline bench.json   # also print changes vs an earlier run
+"""
+import argparse
+import contextlib
+import io
+import json
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List
+
+import ollama_client
+from benchmark_kb import compare, make_fixture, percentiles
+from command_executor import DEFAULT_MODEL, CommandExecutor
+from mock_ollama import MockOllama
+
+# name -> request, expected final status and the reply rules it needs (fix-up rules match the failed command)
+SCENARIOS = {
+    "success": {
+        "request": "bench: print a greeting",
+        "expected": "success",
+        "rules": [{"match": "print a greeting", "response": "echo hello from astra"}],
+    },
+    "multi_command": {
+        "request": "bench: summarize the system",
+        "expected": "success",
+        "rules": [{"match": "summarize the system", "response": "uname -r\necho ok\nwhoami"}],
+    },
+    "fix_retry": {
+        "request": "bench: show the bench notes",
+        "expected": "success",
+        "rules": [
+            {"match": "Command that failed: cat /nonexistent/astra-bench-notes",
+             "response": "The file does not exist.\n$ echo no notes yet"},
+            {"match": "show the bench notes", "response": "cat /nonexistent/astra-bench-notes"},
+        ],
+    },
+    "unrecoverable": {
+        "request": "bench: read the missing report",
+        "expected": "failed",
+        "rules": [
+            {"match": "Command that failed: cat /nonexistent/astra-bench-report",
+             "response": "Try again.\n$ cat /nonexistent/astra-bench-report"},
+            {"match": "read the missing report", "response": "cat /nonexistent/astra-bench-report"},
+        ],
+    },
+    "malformed": {
+        "request": "bench: tell me about penguins",
+        "expected": "failed",
+        "rules": [{"match": "about penguins", "garbage": True,
+                   "response": "Penguins are flightless birds that live mostly in the Southern Hemisphere."}],
+    },
+}
+
+CHAT_RULE = {"match": "bench chat", "response": " ".join(["Linux keeps a page cache of recently read files."] * 8)}
+
+
+def make_executor(workdir: Path, args) -> CommandExecutor:
+    """Executor over a small text knowledge base and fresh history, with caches off (or fresh, with --caches)"""
+    kb_dir = workdir / "kb"
+    kb_dir.mkdir()
+    make_fixture(kb_dir / "fixture.txt", pages=40, seed=7)
+    # Shard caches and SQLite files all live in the scratch directory, never in the user's CACHE_DIR
+    executor = CommandExecutor(str(workdir / "missing.pdf"), str(kb_dir), cache_dir=str(workdir / "cache"))
+    executor.stream_commands = not args.no_stream
+    executor.metrics = None
+    executor.retry_policy.backoff_base = 0.0
+    # History is written on every request, so it stays on to count its cost
+    if not args.caches:
+        # Every request takes the full LLM path
+        for cache in (executor.command_cache, executor.fix_cache):
+            if cache:
+                cache.close()
+        executor.command_cache = None
+        executor.fix_cache = None
+        executor.fast_path = None
+    return executor
+
+
+def run_scenario(executor: CommandExecutor, scenario: Dict, requests: int, concurrency: int) -> Dict:
+    def one(_) -> Dict:
+        start = time.perf_counter()
+        report = executor.execute_with_retry(scenario["request"])
+        return {
+            "latency": time.perf_counter() - start,
+            "ok": report["final_status"] == scenario["expected"],
+            "llm_calls": report["timings"]["llm"]["calls"],
+            "attempts": len(report["attempts"]),
+        }
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, range(requests)))
+    wall = time.perf_counter() - start
+    return {
+        "requests": requests,
+        "requests_per_s": requests / wall,
+        "latency": percentiles([r["latency"] for r in results]),
+        "as_expected": sum(r["ok"] for r in results) / requests,
+        "llm_calls_per_request": sum(r["llm_calls"] for r in results) / requests,
+        "attempts_per_request": sum(r["attempts"] for r in results) / requests,
+    }
+
+
+def run_chat(requests: int, concurrency: int) -> Dict:
+    """Read chat_stream like ChatWorker: time to first chunk, total time and chunks per second"""
+    def one(i) -> Dict:
+        messages = [{"role": "user", "content": f"bench chat {i}"}]
+        start = time.perf_counter()
+        first = None
+        chunks = 0
+        for data in ollama_client.chat_stream(DEFAULT_MODEL, messages):
+            if (data.get("message") or {}).get("content"):
+                chunks += 1
+                if first is None:
+                    first = time.perf_counter() - start
+        return {"ttft": first or 0.0, "total": time.perf_counter() - start, "chunks": chunks}
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, range(requests)))
+    wall = time.perf_counter() - start
+    return {
+        "requests": requests,
+        "requests_per_s": requests / wall,
+        "time_to_first_token": percentiles([r["ttft"] for r in results]),
+        "latency": percentiles([r["total"] for r in results]),
+        "tokens_per_s": sum(r["chunks"] for r in results) / sum(r["total"] for r in results),
+    }
+
+
+def run(args) -> Dict:
+    names = args.scenario or list(SCENARIOS)
+    rules = [rule for name in names for rule in SCENARIOS[name]["rules"]] + [CHAT_RULE]
+    workdir = Path(tempfile.mkdtemp(prefix="astra-exec-bench-"))
+    mock = MockOllama(rules, latency=args.latency, token_rate=args.token_rate).start()
+    ollama_client.configure(mock.url)
+    try:
+        # The executor narrates every step; keep the report readable
+        log = io.StringIO()
+        with contextlib.redirect_stdout(sys.stdout if args.verbose else log):
+            executor = make_executor(workdir, args)
+            executor.execute_with_retry(SCENARIOS[names[0]]["request"])  # Warm up: KB index and connection pool
+            scenarios = {name: run_scenario(executor, SCENARIOS[name], args.requests, args.concurrency)
+                         for name in names}
+            chat = run_chat(args.requests, args.concurrency)
+        return {
+            "mock": {"latency_s": args.latency, "token_rate": args.token_rate},
+            "stream_commands": not args.no_stream,
+            "caches": args.caches,
+            "concurrency": args.concurrency,
+            "scenarios": scenarios,
+            "chat": chat,
+            "llm_requests": mock.request_count("/api/generate") + mock.request_count("/api/chat"),
+        }
+    finally:
+        mock.stop()
+        ollama_client.close_client()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", action="append", choices=list(SCENARIOS), help="run only these (repeatable)")
+    parser.add_argument("--requests", type=int, default=20, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=1, help="requests in flight at once")
+    parser.add_argument("--latency", type=float, default=0.05, help="mock seconds before the first token")
+    parser.add_argument("--token-rate", type=float, default=200.0, help="mock tokens per second")
+    parser.add_argument("--no-stream", action="store_true", help="wait for the full LLM reply before running")
+    parser.add_argument("--caches", action="store_true", help="use fresh command/fix caches and the fast path")
+    parser.add_argument("--verbose", action="store_true", help="show the executor's output")
+    parser.add_argument("--output", help="write the JSON report here")
+    parser.add_argument("--baseline", help="earlier JSON report to compare against")
+    args = parser.parse_args(argv)
+
+    report = run(args)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + "\n", encoding="utf-8")
+    print(text)
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+        print("\nChange vs baseline:", file=sys.stderr)
+        for line in compare(report, baseline):
+            print(f"  {line}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
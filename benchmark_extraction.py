@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Command extraction benchmark - throughput and accuracy of command_extractor
+
+Runs the extractor over a corpus of LLM responses with their expected commands
+(extraction_corpus.json by default) and prints a JSON report: lines/sec for
+whole responses and for token-sized streaming chunks, plus micro-averaged
+precision/recall and the share of responses extracted exactly.
+
+    python benchmark_extraction.py --output extraction.json
+    python benchmark_extraction.py --baseline extraction.json   # also print changes vs an earlier run
+"""
+import argparse
+import json
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List
+
+from benchmark_kb import compare
+from command_extractor import StreamingCommandParser, extract_commands
+
+DEFAULT_CORPUS = Path(__file__).with_name("extraction_corpus.json")
+STREAM_CHUNK = 4  # Characters per simulated token
+
+
+def accuracy(corpus: List[Dict]) -> Dict:
+    true_positives = extracted = expected = exact = 0
+    misses = []
+    for case in corpus:
+        commands = extract_commands(case["response"])
+        overlap = Counter(commands) & Counter(case["expected"])
+        true_positives += sum(overlap.values())
+        extracted += len(commands)
+        expected += len(case["expected"])
+        if commands == case["expected"]:
+            exact += 1
+        else:
+            misses.append({"name": case.get("name", ""), "expected": case["expected"], "extracted": commands})
+    return {
+        "precision": true_positives / extracted if extracted else 1.0,
+        "recall": true_positives / expected if expected else 1.0,
+        "exact_match": exact / len(corpus),
+        "mismatches": misses,
+    }
+
+
+def _stream(text: str) -> List[str]:
+    parser = StreamingCommandParser()
+    commands = []
+    for i in range(0, len(text), STREAM_CHUNK):
+        commands.extend(parser.feed(text[i:i + STREAM_CHUNK]))
+    return commands + parser.close()
+
+
+def throughput(corpus: List[Dict], repeat: int) -> Dict[str, float]:
+    responses = [case["response"] for case in corpus]
+    lines = sum(r.count("\n") + 1 for r in responses) * repeat
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for response in responses:
+            extract_commands(response)
+    whole_s = time.perf_counter() - start
+
+    chunked = [[r[i:i + STREAM_CHUNK] for i in range(0, len(r), STREAM_CHUNK)] for r in responses]
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for chunks in chunked:
+            parser = StreamingCommandParser()
+            for chunk in chunks:
+                parser.feed(chunk)
+            parser.close()
+    stream_s = time.perf_counter() - start
+
+    return {
+        "lines": lines,
+        "lines_per_s": lines / whole_s,
+        "stream_lines_per_s": lines / stream_s,
+    }
+
+
+def main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", default=str(DEFAULT_CORPUS),
+                        help='JSON list of {"name", "response", "expected": [...]}')
+    parser.add_argument("--repeat", type=int, default=2000, help="passes over the corpus for timing")
+    parser.add_argument("--output", help="write the JSON report here")
+    parser.add_argument("--baseline", help="earlier JSON report to compare against")
+    args = parser.parse_args(argv)
+
+    corpus = json.loads(Path(args.corpus).read_text(encoding="utf-8"))
+    # Streaming must find exactly what whole-response extraction finds
+    stream_consistent = all(_stream(case["response"]) == extract_commands(case["response"]) for case in corpus)
+    report = {
+        "corpus": args.corpus,
+        "responses": len(corpus),
+        "throughput": throughput(corpus, args.repeat),
+        "accuracy": accuracy(corpus),
+        "stream_consistent": stream_consistent,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + "\n", encoding="utf-8")
+    print(text)
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+        print("\nChange vs baseline:", file=sys.stderr)
+        for line in compare(report, baseline):
+            print(f"  {line}", file=sys.stderr)
+    return 0 if stream_consistent else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
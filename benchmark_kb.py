@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Knowledge base retrieval benchmark - speed and relevance of PDFKnowledgeBase search
+
+Runs offline against a generated text fixture (or --source with --labels) and
+prints a JSON report: index build time, cache load time, p50/p95/p99 query
+latency, memory use and recall@k / MRR on labeled request -> page pairs.
+
+    python benchmark_kb.py --output bench.json
+    python benchmark_kb.py --baseline bench.json   # also print changes vs an earlier run
+"""
+import argparse
+import json
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Dict, List
+
+from pdf_knowledge_base import PDFKnowledgeBase
+from sharded_knowledge_base import TextKnowledgeBase
+
+# (request, text planted on the expected page) - requests avoid copying the planted wording
+TOPICS = [
+    ("check disk space", "The df command reports free and used disk space.\n$ df -h\nFilesystem Size Used Avail"),
+    ("how much memory is free", "Use free to display RAM and swap usage.\n$ free -m\nMem: total used free"),
+    ("install a package", "Install software from the repositories with apt-get.\n$ sudo apt-get install vim"),
+    ("restart a service", "Services are controlled with systemctl.\n$ sudo systemctl restart ssh"),
+    ("show running processes", "The ps command lists processes.\n$ ps aux | less"),
+    ("find files by name", "Search the directory tree with find.\n$ find /home -name '*.conf'"),
+    ("show ip address", "The ip command shows interfaces and addresses.\n$ ip addr show"),
+    ("kernel version", "Print the running kernel release with uname.\n$ uname -r"),
+    ("compress a directory", "Create a gzip compressed tar archive.\n$ tar czvf backup.tar.gz /etc"),
+    ("change file permissions", "Use chmod to change the mode bits.\n$ chmod 644 file.txt"),
+    ("system uptime", "See how long the system has been running.\n$ uptime\nload average"),
+    ("list usb devices", "The lsusb command lists USB buses and devices.\n$ lsusb -v"),
+    ("remove a package", "Remove installed software with apt-get remove or purge.\n$ sudo apt-get purge vim"),
+    ("mount a partition", "Attach a filesystem with mount.\n$ sudo mount /dev/sdb1 /mnt/usb"),
+    ("copy files to another host", "Copy over ssh with scp or rsync.\n$ rsync -av dir/ host:/backup/"),
+    ("kill a process", "Send a signal to a process with kill.\n$ kill -9 1234"),
+]
+
+FILLER = (
+    "linux ubuntu debian system user file directory command option output shell terminal "
+    "configuration server network package software example shows display running chapter "
+    "section manual administration tools utilities desktop default root account access"
+).split()
+
+
+def make_fixture(path: Path, pages: int, seed: int) -> List[Dict]:
+    """Write a form-feed separated text 'book' and return the labeled set"""
+    rng = random.Random(seed)
+    texts = [" ".join(rng.choice(FILLER) for _ in range(250)) for _ in range(pages)]
+    labels = []
+    for request, planted in TOPICS:
+        page = rng.randrange(pages)
+        texts[page] += "\n" + planted
+        labels.append({"query": request, "pages": [page + 1]})
+    path.write_text("\f".join(texts), encoding="utf-8")
+    return labels
+
+
+def open_kb(source: Path, cache_dir: str) -> PDFKnowledgeBase:
+    if source.suffix.lower() == ".pdf":
+        return PDFKnowledgeBase(str(source), cache_dir)
+    return TextKnowledgeBase(str(source), cache_dir)
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    ordered = sorted(samples)
+
+    def pct(p: float) -> float:
+        return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+    return {
+        "p50_ms": pct(50) * 1000,
+        "p95_ms": pct(95) * 1000,
+        "p99_ms": pct(99) * 1000,
+        "mean_ms": sum(ordered) / len(ordered) * 1000,
+    }
+
+
+def time_queries(fn, queries: List[str], repeat: int, clear_cache) -> Dict[str, float]:
+    samples = []
+    for _ in range(repeat):
+        for query in queries:
+            clear_cache()  # Measure retrieval itself, not the LRU
+            start = time.perf_counter()
+            fn(query)
+            samples.append(time.perf_counter() - start)
+    return percentiles(samples)
+
+
+def relevance(kb: PDFKnowledgeBase, labels: List[Dict], k: int) -> Dict[str, float]:
+    hits = 0
+    reciprocal_ranks = 0.0
+    for label in labels:
+        pages = [r["page"] for r in kb.search(label["query"], max_results=k)]
+        expected = set(label["pages"])
+        ranks = [i for i, page in enumerate(pages, 1) if page in expected]
+        if ranks:
+            hits += 1
+            reciprocal_ranks += 1 / ranks[0]
+    return {f"recall@{k}": hits / len(labels), "mrr": reciprocal_ranks / len(labels)}
+
+
+def run(args) -> Dict:
+    workdir = Path(tempfile.mkdtemp(prefix="astra-kb-bench-"))
+    try:
+        if args.source:
+            source = Path(args.source)
+            labels = json.loads(Path(args.labels).read_text(encoding="utf-8")) if args.labels else []
+        else:
+            source = workdir / "fixture.txt"
+            labels = make_fixture(source, args.pages, args.seed)
+        cache_dir = str(workdir / "cache")
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        kb = open_kb(source, cache_dir)
+        build_s = time.perf_counter() - start
+        _, build_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        start = time.perf_counter()
+        kb = open_kb(source, cache_dir)
+        load_s = time.perf_counter() - start
+
+        queries = [label["query"] for label in labels] or ["disk space", "install package"]
+        clear = kb.query_cache.clear
+        report = {
+            "source": str(source) if args.source else f"synthetic:{args.pages}pages:seed{args.seed}",
+            "pages": len(kb.content),
+            "passages": len(kb.passage_index),
+            "vocabulary": len(kb.index.terms),
+            "build_s": build_s,
+            "cache_load_ms": load_s * 1000,
+            "cache_bytes": kb.cache_path.stat().st_size,
+            "build_peak_python_mb": build_peak / 2**20,
+            "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+            "latency": {
+                "search": time_queries(kb.search, queries, args.repeat, clear),
+                "search_passages": time_queries(kb.search_passages, queries, args.repeat, clear),
+                "get_context": time_queries(kb.get_context, queries, args.repeat, clear),
+                "search_many_per_query": percentiles(
+                    [_time_batch(kb, queries, clear) / len(queries) for _ in range(args.repeat)]
+                ),
+            },
+        }
+        if labels:
+            report["relevance"] = relevance(kb, labels, args.k)
+        return report
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def _time_batch(kb: PDFKnowledgeBase, queries: List[str], clear_cache) -> float:
+    clear_cache()
+    start = time.perf_counter()
+    kb.search_many(queries)
+    return time.perf_counter() - start
+
+
+def compare(report: Dict, baseline: Dict, prefix: str = "") -> List[str]:
+    """Lines describing how every numeric metric moved relative to the baseline"""
+    lines = []
+    for key, value in report.items():
+        old = baseline.get(key)
+        if isinstance(value, dict) and isinstance(old, dict):
+            lines.extend(compare(value, old, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)) and isinstance(old, (int, float)) and old:
+            lines.append(f"{prefix}{key}: {old:.4g} -> {value:.4g} ({(value - old) / old * 100:+.1f}%)")
+    return lines
+
+
+def main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--source", help="PDF or text file to benchmark instead of the synthetic fixture")
+    parser.add_argument("--labels", help='JSON list of {"query": ..., "pages": [...]} for --source')
+    parser.add_argument("--pages", type=int, default=400, help="pages in the synthetic fixture")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--repeat", type=int, default=20, help="passes over the query set")
+    parser.add_argument("-k", type=int, default=5, help="cutoff for recall@k")
+    parser.add_argument("--output", help="write the JSON report here")
+    parser.add_argument("--baseline", help="earlier JSON report to compare against")
+    args = parser.parse_args(argv)
+
+    report = run(args)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + "\n", encoding="utf-8")
+    print(text)
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+        print("\nChange vs baseline:", file=sys.stderr)
+        for line in compare(report, baseline):
+            print(f"  {line}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
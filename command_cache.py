@@ -0,0 +1,122 @@
+"""
+Command Cache - Persistent SQLite map from user requests to the commands that last completed them
+"""
+import os
+import re
+import json
+import time
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional
+
+CACHE_DIR = Path(os.environ.get("ASTRA_CHATBOT_CACHE_DIR", Path.home() / ".cache" / "astra-chatbot"))
+DEFAULT_TTL = 7 * 24 * 3600  # Package names and flags drift; re-ask the model weekly
+DEFAULT_MAX_ENTRIES = 500
+
+# Politeness words that never change which commands a request needs
+FILLER_WORDS = frozenset("please kindly can could would you".split())
+WORD_RE = re.compile(r"[^\s?!,;]+")
+
+
+def normalize_request(request: str) -> str:
+    """Cache key for a request: lowercased words in order, filler words and trailing punctuation dropped"""
+    words = (w.rstrip('.:') for w in WORD_RE.findall(request.lower()))
+    return " ".join(w for w in words if w and w not in FILLER_WORDS)
+
+
+class CommandCache:
+    """
+    Request -> command list cache keyed on the normalized request plus model name.
+
+    Entries expire after `ttl` seconds, the least recently used ones are evicted
+    beyond `max_entries`, and a request that fails is removed so the next try
+    goes back to the LLM.
+    """
+
+    def __init__(self, path: Optional[str] = None, ttl: float = DEFAULT_TTL,
+                 max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.path = Path(path) if path else CACHE_DIR / "commands.sqlite3"
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # One connection shared by the GUI and worker threads, serialized by the lock
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS commands (
+                    request TEXT NOT NULL,
+                    model TEXT NOT NULL,
+                    commands TEXT NOT NULL,
+                    created REAL NOT NULL,
+                    last_used REAL NOT NULL,
+                    uses INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (request, model)
+                )""")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS commands_last_used ON commands (last_used)")
+
+    def get(self, request: str, model: str) -> Optional[List[str]]:
+        """Cached commands for the request, or None if missing or expired"""
+        key = normalize_request(request)
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT commands, created FROM commands WHERE request = ? AND model = ?", (key, model)
+            ).fetchone()
+            if row is None or now - row[1] > self.ttl:
+                if row is not None:
+                    self._conn.execute("DELETE FROM commands WHERE request = ? AND model = ?", (key, model))
+                self.misses += 1
+                return None
+            self._conn.execute(
+                "UPDATE commands SET last_used = ?, uses = uses + 1 WHERE request = ? AND model = ?",
+                (now, key, model)
+            )
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, request: str, model: str, commands: List[str]):
+        """
+        Remember the commands that completed the request, evicting the least recently used beyond max_entries.
+        Storing the same commands again (a cache hit that worked) keeps the entry's age and use count,
+        so a frequently used entry still expires after ttl.
+        """
+        if not commands:
+            return
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute("""
+                INSERT INTO commands (request, model, commands, created, last_used) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (request, model) DO UPDATE SET
+                    created = CASE WHEN commands = excluded.commands THEN created ELSE excluded.created END,
+                    uses = CASE WHEN commands = excluded.commands THEN uses ELSE 0 END,
+                    commands = excluded.commands, last_used = excluded.last_used
+            """, (normalize_request(request), model, json.dumps(commands), now, now))
+            self._conn.execute(
+                "DELETE FROM commands WHERE rowid IN ("
+                "SELECT rowid FROM commands ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+
+    def invalidate(self, request: str, model: str):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM commands WHERE request = ? AND model = ?", (normalize_request(request), model)
+            )
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM commands")
+        self.hits = self.misses = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            (entries,) = self._conn.execute("SELECT COUNT(*) FROM commands").fetchone()
+        return {"entries": entries, "hits": self.hits, "misses": self.misses}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -2,150 +2,291 @@
 Intelligent Command Executor - Uses LLM + Ubuntu Linux Toolbox to execute commands with retry logic
 """
 import os
+import codecs
+import select
+import signal
 import subprocess
 import json
-import httpx
-from typing import Dict, List, Optional, Tuple
+import time
+import threading
+from collections import deque
+from typing import Callable, Deque, Dict, Iterator, List, Optional, Tuple
 from pathlib import Path
+import ollama_client
+from command_cache import CommandCache
+from command_extractor import StreamingCommandParser, extract_commands
+from execution_history import ExecutionHistory
+from fast_path import FastPath
+from fix_cache import FixCache
+from metrics import MetricsExporter, Timings, llm_stats
+from retry_policy import ASK_LLM, BACKOFF, RETRY, STOP, RetryPolicy, classify
+from scheduler import MAX_PARALLEL, CommandScheduler
 from pdf_knowledge_base import PDFKnowledgeBase
+from sharded_knowledge_base import ShardedKnowledgeBase
 
-OLLAMA_API = os.environ.get("OLLAMA_API", "http://localhost:11434")
 DEFAULT_MODEL = os.environ.get("ASTRA_CHATBOT_MODEL", "qwen2.5:0.5b")
+LLM_KEEP_ALIVE = "10m"  # Keep the model loaded between a request and its fix-up calls
+# Every prompt starts with the same text, so Ollama can reuse the evaluated prefix
+PROMPT_PREFIX = """You are a Linux system expert on an Ubuntu/Debian system.
+You turn tasks into the exact Linux commands to run, one per line, and fix commands that fail."""
+COMMAND_TIMEOUT = 60
+# (head, tail) characters kept per stream for the report; the middle of long output is dropped
+OUTPUT_LIMITS = {"stdout": (1500, 1500), "stderr": (300, 700)}
+READ_CHUNK = 8192  # Longest piece read at once, so output without newlines stays bounded too
+POLL_INTERVAL = 0.1  # Seconds a reader waits for output before checking whether to stop
+
+
+class OutputBuffer:
+    """Keeps the first head_size and last tail_size characters written to it"""
+    
+    def __init__(self, head_size: int, tail_size: int):
+        self.head_size = head_size
+        self.tail_size = tail_size
+        self.head: List[str] = []
+        self.head_len = 0
+        self.tail: Deque[str] = deque()
+        self.tail_len = 0
+        self.dropped = 0
+    
+    def write(self, text: str):
+        if self.head_len < self.head_size:
+            part = text[:self.head_size - self.head_len]
+            self.head.append(part)
+            self.head_len += len(part)
+            text = text[len(part):]
+            if not text:
+                return
+        self.tail.append(text)
+        self.tail_len += len(text)
+        # Drop whole pieces while the rest still fills the tail
+        while self.tail_len - len(self.tail[0]) >= self.tail_size:
+            self.dropped += len(self.tail[0])
+            self.tail_len -= len(self.tail.popleft())
+    
+    def getvalue(self) -> str:
+        head = "".join(self.head)
+        tail = "".join(self.tail)
+        dropped = self.dropped + max(0, len(tail) - self.tail_size)
+        if not dropped:
+            return head + tail
+        # The marker replaces the end of the head so the result stays within head_size + tail_size
+        marker = f"\n... ({dropped} characters omitted) ...\n"
+        return head[:self.head_size - len(marker)] + marker + tail[-self.tail_size:]
+
+
+def _pump(pipe, buffer: OutputBuffer, on_output: Optional[Callable[[str], None]], stop: threading.Event):
+    """
+    Reader thread: copy a pipe into its buffer and to on_output line by line until EOF or `stop`.
+    Polls the raw descriptor, so a background child that keeps the pipe open can't block it
+    (and the pipe is closed here: closing it from another thread would wait for a blocked read).
+    """
+    def emit(line: str):
+        buffer.write(line)
+        if on_output:
+            try:
+                on_output(line.rstrip("\n"))
+            except Exception:
+                pass  # A broken listener must not stall the command
+    
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    pending = ""
+    with pipe:
+        fd = pipe.fileno()
+        while not stop.is_set():
+            ready, _, _ = select.select([fd], [], [], POLL_INTERVAL)
+            if not ready:
+                continue
+            data = os.read(fd, READ_CHUNK)
+            if not data:
+                break
+            *lines, pending = (pending + decoder.decode(data)).split("\n")
+            for line in lines:
+                emit(line + "\n")
+            if len(pending) >= READ_CHUNK:
+                emit(pending)
+                pending = ""
+        pending += decoder.decode(b"", final=True)
+        if pending:
+            emit(pending)
+
+class LLMSession:
+    """
+    Model-side context shared by the LLM calls of one execute_with_retry run.
+    
+    The initial call's returned Ollama `context` (prefix, task and answer tokens)
+    becomes the base of every fix-up call, so those only send what is new: the
+    failed command, its error and its reference section.
+    """
+    
+    def __init__(self):
+        self.context: Optional[List[int]] = None
+
 
 class CommandExecutor:
-    def __init__(self, pdf_path: str):
-        self.pdf_kb = PDFKnowledgeBase(pdf_path)
+    def __init__(self, pdf_path: str, sources_dir: Optional[str] = None, cache_dir: Optional[str] = None):
+        """cache_dir holds the shard caches and the SQLite caches (default: CACHE_DIR)"""
+        cache_path = Path(cache_dir) if cache_dir else None
+        if sources_dir:
+            # The PDF becomes one shard next to everything in sources_dir
+            self.pdf_kb = ShardedKnowledgeBase(sources_dir, extra_sources=[pdf_path],
+                                               cache_dir=str(cache_path / "kb") if cache_path else None)
+        else:
+            self.pdf_kb = PDFKnowledgeBase(pdf_path)
         self.max_attempts = 5
-        self.execution_history = []
+        # Prompt-token budgets for knowledge base context; prompt processing dominates latency
+        self.context_tokens = 200
+        self.fix_context_tokens = 120
+        # Run each command as soon as the streamed LLM response completes its line
+        self.stream_commands = True
+        # Read-only commands between two mutating ones run side by side
+        self.max_parallel = MAX_PARALLEL
+        self.retry_policy = RetryPolicy()
+        # Optional per-request timing export (ASTRA_CHATBOT_METRICS=path.jsonl or path.prom)
+        self.metrics = MetricsExporter.from_env()
+        self.fast_path = FastPath()
+        try:
+            self.command_cache = CommandCache(str(cache_path / "commands.sqlite3") if cache_path else None)
+        except Exception as e:
+            print(f"⚠️  Command cache disabled: {e}")
+            self.command_cache = None
+        try:
+            self.fix_cache = FixCache(str(cache_path / "fixes.sqlite3") if cache_path else None)
+        except Exception as e:
+            print(f"⚠️  Fix cache disabled: {e}")
+            self.fix_cache = None
+        try:
+            self.execution_history = ExecutionHistory(str(cache_path / "history.sqlite3") if cache_path else None)
+        except Exception as e:
+            print(f"⚠️  Execution history disabled: {e}")
+            self.execution_history = None
     
-    def ask_llm(self, prompt: str, context: str = "") -> str:
-        """Ask LLM for help"""
+    def _llm_payload(self, prompt: str, context: str, session: Optional[LLMSession] = None) -> Dict:
+        full_prompt = f"{context}\n\n{prompt}" if context else prompt
+        payload = {
+            "model": DEFAULT_MODEL,
+            "keep_alive": LLM_KEEP_ALIVE,
+            "options": {
+                "temperature": 0.1,  # Reduced from 0.3 for more deterministic
+                "num_predict": 200   # Reduced from 500 for faster response
+            }
+        }
+        if session and session.context:
+            # The prefix and the task are already in the session context
+            payload["context"] = session.context
+            payload["prompt"] = full_prompt
+        else:
+            payload["prompt"] = f"{PROMPT_PREFIX}\n\n{full_prompt}"
+        return payload
+    
+    def ask_llm(self, prompt: str, context: str = "", session: Optional[LLMSession] = None,
+                start_session: bool = False, stats: Optional[Dict] = None) -> str:
+        """
+        Ask LLM for help; start_session keeps the call's context as the session's base for later calls,
+        stats (if given) receives the call's timings and token counts
+        """
         try:
-            full_prompt = f"{context}\n\n{prompt}" if context else prompt
-            
-            with httpx.Client(timeout=60.0) as client:  # Increased from 30 to 60
-                response = client.post(
-                    f"{OLLAMA_API}/api/generate",
-                    json={
-                        "model": DEFAULT_MODEL,
-                        "prompt": full_prompt,
-                        "stream": False,
-                        "options": {
-                            "temperature": 0.1,  # Reduced from 0.3 for more deterministic
-                            "num_predict": 200   # Reduced from 500 for faster response
-                        }
-                    }
-                )
-                response.raise_for_status()
-                return response.json().get("response", "").strip()
+            start = time.monotonic()
+            # Shared keep-alive client: retries reuse the same connection
+            response = ollama_client.generate(self._llm_payload(prompt, context, session))
+            if start_session and session is not None:
+                session.context = response.get("context")
+            if stats is not None:
+                stats.update(llm_stats(response, time.monotonic() - start))
+            return response.get("response", "").strip()
         
         except Exception as e:
             return f"LLM Error: {str(e)}"
     
+    def ask_llm_stream(self, prompt: str, context: str = "", session: Optional[LLMSession] = None,
+                       start_session: bool = False, stats: Optional[Dict] = None) -> Iterator[str]:
+        """Ask LLM for help, yielding response tokens as they are generated"""
+        try:
+            start = time.monotonic()
+            for data in ollama_client.generate_stream(self._llm_payload(prompt, context, session)):
+                token = data.get("response", "")
+                if token:
+                    yield token
+                if data.get("done"):
+                    if start_session and session is not None:
+                        session.context = data.get("context")
+                    if stats is not None:
+                        stats.update(llm_stats(data, time.monotonic() - start))
+        
+        except Exception as e:
+            yield f"LLM Error: {str(e)}"
+    
     def extract_commands(self, text: str) -> List[str]:
         """Extract shell commands from LLM response"""
-        commands = []
-        lines = text.split('\n')
-        in_code_block = False
-        
-        # Common command prefixes - expanded to include system info commands
-        command_prefixes = [
-            # Package management
-            'sudo', 'apt', 'apt-get', 'dpkg', 'snap', 'systemctl', 
-            'flatpak', 'add-apt-repository', 'update-alternatives',
-            # Network tools
-            'wget', 'curl', 'ping', 'netstat', 'ss', 'ip', 'ifconfig',
-            # Development
-            'git', 'pip', 'python', 'python3', 'node', 'npm', 'bash', 'sh',
-            # File operations
-            'chmod', 'chown', 'mkdir', 'rm', 'cp', 'mv', 'ln', 'touch',
-            'cat', 'less', 'more', 'head', 'tail', 'nano', 'vi', 'vim',
-            # Search and text processing
-            'grep', 'find', 'sed', 'awk', 'sort', 'uniq', 'wc',
-            # Compression
-            'tar', 'gzip', 'gunzip', 'zip', 'unzip', 'bzip2',
-            # System information (IMPORTANT - these were missing!)
-            'df', 'du', 'free', 'top', 'htop', 'ps', 'lsblk', 'lsof',
-            'uname', 'uptime', 'who', 'whoami', 'id', 'hostname',
-            # Process management
-            'kill', 'killall', 'pkill', 'service', 'jobs', 'bg', 'fg',
-            # Other common commands
-            'echo', 'date', 'cal', 'which', 'whereis', 'man',
-            'install', 'gpg', 'ssh', 'scp', 'rsync', 'mount', 'umount'
-        ]
-        
-        for line in lines:
-            line = line.strip()
-            
-            # Skip empty lines
-            if not line:
-                continue
-            
-            # Handle code blocks
-            if line.startswith('```'):
-                in_code_block = not in_code_block
-                continue
-            
-            # Extract commands from code blocks
-            if in_code_block:
-                # Remove common prefixes like '$ ' or '# '
-                if line.startswith('$ '):
-                    commands.append(line[2:].strip())
-                elif line.startswith('# ') and not line.startswith('##'):
-                    # Skip comments unless they look like commands
-                    continue
-                else:
-                    # Check if it looks like a command
-                    first_word = line.split()[0] if line.split() else ''
-                    if first_word in command_prefixes:
-                        commands.append(line)
-                continue
-            
-            # Outside code blocks
-            # Remove $ prefix if present
-            if line.startswith('$ '):
-                commands.append(line[2:].strip())
-            elif line.startswith('$'):
-                commands.append(line[1:].strip())
-            # Check for command prefixes
-            elif any(line.startswith(prefix + ' ') or line == prefix for prefix in command_prefixes):
-                commands.append(line)
-            # Check for numbered lists (e.g., "1. sudo apt install...")
-            elif line[0].isdigit() and '. ' in line:
-                cmd_part = line.split('. ', 1)[1].strip()
-                if any(cmd_part.startswith(prefix + ' ') for prefix in command_prefixes):
-                    commands.append(cmd_part)
-        
-        return commands
+        return extract_commands(text)
     
-    def execute_command(self, command: str) -> Tuple[bool, str, str]:
+    def execute_command(self, command: str, on_output: Optional[Callable[[str], None]] = None,
+                        info: Optional[Dict] = None) -> Tuple[bool, str, str]:
         """
-        Execute a shell command
-        Returns: (success, stdout, stderr)
+        Execute a shell command, streaming each output line to on_output as it is produced
+        info (if given) receives the exit_status (None if the command timed out or could not start)
+        Returns: (success, stdout, stderr) - head and tail of each stream, bounded by OUTPUT_LIMITS
         """
+        if info is not None:
+            info["exit_status"] = None
         try:
-            result = subprocess.run(
+            # Own session, so a timeout kills the whole pipeline and not just the shell
+            process = subprocess.Popen(
                 command,
                 shell=True,
-                capture_output=True,
-                text=True,
-                timeout=60
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                bufsize=0,
+                start_new_session=True
             )
-            
-            success = result.returncode == 0
-            return success, result.stdout, result.stderr
-        
-        except subprocess.TimeoutExpired:
-            return False, "", "Command timed out after 60 seconds"
         except Exception as e:
             return False, "", str(e)
+        
+        buffers = {name: OutputBuffer(*OUTPUT_LIMITS[name]) for name in ("stdout", "stderr")}
+        stop = threading.Event()
+        readers = [
+            threading.Thread(target=_pump, args=(pipe, buffers[name], on_output, stop), daemon=True)
+            for name, pipe in (("stdout", process.stdout), ("stderr", process.stderr))
+        ]
+        for reader in readers:
+            reader.start()
+        
+        # One deadline for the shell and its output: a background child ("firefox &")
+        # keeps the pipes open after the shell has exited
+        deadline = time.monotonic() + COMMAND_TIMEOUT
+        try:
+            returncode = process.wait(timeout=COMMAND_TIMEOUT)
+        except subprocess.TimeoutExpired:
+            returncode = None
+        for reader in readers:
+            reader.join(max(0.0, deadline - time.monotonic()))
+        if returncode is None or any(reader.is_alive() for reader in readers):
+            try:
+                os.killpg(process.pid, signal.SIGKILL)
+            except OSError:
+                pass
+            stop.set()  # Readers close the pipes; a child that left the session can't hold them up
+            process.wait()
+            for reader in readers:
+                reader.join()
+            returncode = None
+        
+        stdout, stderr = buffers["stdout"].getvalue(), buffers["stderr"].getvalue()
+        if info is not None:
+            info["exit_status"] = returncode
+        if returncode is None:
+            return False, stdout, f"Command timed out after {COMMAND_TIMEOUT} seconds"
+        return returncode == 0, stdout, stderr
     
-    def analyze_error(self, command: str, error: str, attempt: int) -> str:
+    def analyze_error(self, command: str, error: str, attempt: int, session: Optional[LLMSession] = None,
+                      stats: Optional[Dict] = None) -> str:
         """Use LLM to analyze error and suggest fix"""
-        # Get relevant context from PDF
-        pdf_context = self.pdf_kb.get_context(f"{command} error fix")
+        start = time.monotonic()
+        # Prefer the book's section on the failing program over a keyword search
+        pdf_context = (self.pdf_kb.get_command_context(command, self.fix_context_tokens)
+                       or self.pdf_kb.get_context(f"{command} error fix", self.fix_context_tokens))
+        retrieval_s = time.monotonic() - start
         
-        prompt = f"""You are a Linux system expert. A command failed and you need to fix it.
+        prompt = f"""A command failed and you need to fix it.
 
 Command that failed: {command}
 Error message: {error}
@@ -157,23 +298,67 @@ Based on the Ubuntu Linux Toolbox reference and your knowledge, provide:
 
 Be concise and provide working commands only."""
         
-        return self.ask_llm(prompt, pdf_context)
+        response = self.ask_llm(prompt, pdf_context, session, stats=stats)
+        if stats is not None:
+            stats["retrieval_s"] = retrieval_s
+        return response
     
-    def execute_with_retry(self, user_request: str) -> Dict:
+    def execute_with_retry(self, user_request: str, on_output: Optional[Callable[[str], None]] = None) -> Dict:
         """
         Main execution method with retry logic
+        on_output receives each command line ("$ ...") and its output lines as they are produced
         Returns execution report
         """
         report = {
             "request": user_request,
             "attempts": [],
             "final_status": "failed",
-            "summary": ""
+            "summary": "",
+            "source": "llm"  # Where the commands came from: fast_path, cache or llm
         }
+        timings = Timings()
+        try:
+            self._execute(user_request, report, timings, on_output)
+        finally:
+            report["timings"] = timings.summary(report["attempts"])
+            if self.metrics:
+                try:
+                    self.metrics.record(report)
+                except Exception as e:
+                    print(f"⚠️  Could not export metrics: {e}")
+            if self.execution_history:
+                try:
+                    self.execution_history.record(report)
+                except Exception as e:
+                    print(f"⚠️  Could not save execution history: {e}")
+        return report
+    
+    def _execute(self, user_request: str, report: Dict, timings: Timings,
+                 on_output: Optional[Callable[[str], None]] = None) -> Dict:
+        # Fresh model-side context per request; fix-ups build on this request's initial call
+        session = LLMSession()
+        
+        # Step 0: Common read-only queries map straight to a fixed command
+        with timings.stage("fast_path"):
+            intent = self.fast_path.resolve(user_request) if self.fast_path else None
+        if intent:
+            stats = self.fast_path.stats()
+            print(f"\n⚡ Fast path: {intent[0]} (hit rate {stats['hit_rate']:.0%} of {stats['requests']} requests)")
+            report["source"] = "fast_path"
+            return self._finish(user_request, intent[1], None, report, on_output, session)
+        
+        # Reuse the commands that completed this request last time
+        with timings.stage("command_cache"):
+            cached = self.command_cache.get(user_request, DEFAULT_MODEL) if self.command_cache else None
+        if cached:
+            print(f"\n⚡ Using cached commands for: {user_request}")
+            report["source"] = "cache"
+            return self._finish(user_request, cached, None, report, on_output, session)
         
         # Step 1: Get initial command from LLM + PDF
         print(f"\n🤖 Understanding request: {user_request}")
-        pdf_context = self.pdf_kb.get_context(user_request)
+        with timings.stage("retrieval"):
+            pdf_context = self.pdf_kb.get_context(user_request, self.context_tokens)
         
         initial_prompt = f"""Task: {user_request}
 
@@ -189,10 +374,19 @@ sudo apt install -y docker.io
 
 Your commands:"""
         
-        llm_response = self.ask_llm(initial_prompt, pdf_context)
-        print(f"\n📝 LLM Response:\n{llm_response[:500]}\n")
-        
-        commands = self.extract_commands(llm_response)
+        llm_call: Dict = {}
+        if self.stream_commands:
+            # Commands start running while the model is still generating the rest
+            llm_response, commands, all_succeeded = self._generate_and_run(
+                initial_prompt, pdf_context, report, on_output, session, llm_call)
+            print(f"\n📝 LLM Response:\n{llm_response[:500]}\n")
+        else:
+            llm_response = self.ask_llm(initial_prompt, pdf_context, session, start_session=True, stats=llm_call)
+            print(f"\n📝 LLM Response:\n{llm_response[:500]}\n")
+            commands = self.extract_commands(llm_response)
+            all_succeeded = None
+        report["llm"] = llm_call
+        timings.add_llm(llm_call)
         
         if not commands:
             print(f"⚠️  No commands extracted. Full LLM response:")
@@ -207,62 +401,167 @@ Your commands:"""
             })
             return report
         
+        return self._finish(user_request, commands, all_succeeded, report, on_output, session)
+    
+    def _finish(self, user_request: str, commands: List[str], all_succeeded: Optional[bool], report: Dict,
+                on_output: Optional[Callable[[str], None]] = None, session: Optional[LLMSession] = None) -> Dict:
+        """Run the commands (unless the pipeline already did) and update the command cache"""
         print(f"📋 Identified {len(commands)} command(s) to execute:")
         for i, cmd in enumerate(commands, 1):
             print(f"  {i}. {cmd}")
         
         # Step 2: Execute commands with retry logic
-        for cmd_idx, command in enumerate(commands, 1):
-            print(f"\n{'='*60}")
-            print(f"Command {cmd_idx}/{len(commands)}: {command}")
-            print(f"{'='*60}")
-            
-            for attempt in range(1, self.max_attempts + 1):
-                print(f"\n🔄 Attempt {attempt}/{self.max_attempts}")
-                
-                success, stdout, stderr = self.execute_command(command)
-                
-                attempt_data = {
-                    "attempt": attempt,
-                    "command": command,
-                    "success": success,
-                    "stdout": stdout[:3000],  # Increased from 500 to 3000
-                    "stderr": stderr[:1000]   # Increased from 500 to 1000
-                }
-                report["attempts"].append(attempt_data)
-                
-                if success:
-                    print(f"✅ Command succeeded!")
-                    if stdout:
-                        print(f"Output: {stdout[:200]}")
-                    break
-                else:
-                    print(f"❌ Command failed: {stderr[:200]}")
-                    
-                    if attempt < self.max_attempts:
-                        # Analyze error and get fix
-                        print(f"\n🔍 Analyzing error...")
-                        fix_response = self.analyze_error(command, stderr, attempt)
-                        print(f"💡 LLM suggests:\n{fix_response[:300]}")
-                        
-                        # Extract new command from fix
-                        new_commands = self.extract_commands(fix_response)
-                        if new_commands:
-                            command = new_commands[0]  # Try first suggested fix
-                            print(f"\n🔧 Trying alternative: {command}")
-                        else:
-                            print(f"⚠️  No alternative command found, retrying same command...")
-                    else:
-                        print(f"\n❌ Max attempts reached for this command")
-                        report["final_status"] = "failed"
-                        report["summary"] = f"Failed after {self.max_attempts} attempts. Last error: {stderr[:200]}"
-                        return report
+        if all_succeeded is None:
+            scheduler = self._scheduler(on_output, len(commands), session)
+            for command in commands:
+                scheduler.submit(command)
+            all_succeeded = scheduler.finish(report)
+        if not all_succeeded:
+            if self.command_cache and report["source"] != "fast_path":
+                self.command_cache.invalidate(user_request, DEFAULT_MODEL)
+            return report
         
         # All commands succeeded
         report["final_status"] = "success"
         report["summary"] = f"✅ Successfully executed all commands"
+        if self.command_cache and report["source"] != "fast_path":
+            # Store what actually worked, including fixes that replaced the original commands
+            self.command_cache.put(user_request, DEFAULT_MODEL,
+                                   [a["command"] for a in report["attempts"] if a["success"]])
         return report
     
+    def _scheduler(self, on_output: Optional[Callable[[str], None]] = None, total: Optional[int] = None,
+                   session: Optional[LLMSession] = None) -> CommandScheduler:
+        """Scheduler running each command through the retry loop; output lines are tagged with the command number"""
+        def run(cmd_idx: int, command: str, step: Dict) -> bool:
+            tagged = (lambda line: on_output(f"[{cmd_idx}] {line}")) if on_output else None
+            return self._run_with_retry(cmd_idx, command, step, total, tagged, session)
+        return CommandScheduler(run, self.max_parallel)
+    
+    def _generate_and_run(self, prompt: str, context: str, report: Dict,
+                          on_output: Optional[Callable[[str], None]] = None,
+                          session: Optional[LLMSession] = None,
+                          stats: Optional[Dict] = None) -> Tuple[str, List[str], bool]:
+        """
+        Stream the LLM response and schedule each command as soon as its line is complete,
+        so command 1 runs while the model is still generating commands 2..n.
+        Returns (full response, commands, whether all of them succeeded)
+        """
+        parser = StreamingCommandParser()
+        scheduler = self._scheduler(on_output, session=session)
+        response = ""
+        
+        def submit(new_commands: List[str]):
+            for command in new_commands:
+                print(f"📋 Command {scheduler.submit(command)} ready: {command}")
+        
+        stream = self.ask_llm_stream(prompt, context, session, start_session=True, stats=stats)
+        for token in stream:
+            response += token
+            submit(parser.feed(token))
+            if scheduler.failed.is_set():
+                stream.close()  # Nothing after a failed command will run; stop generating
+                break
+        else:
+            submit(parser.close())
+        all_succeeded = scheduler.finish(report)
+        
+        return response.strip(), scheduler.commands, all_succeeded
+    
+    def _run_with_retry(self, cmd_idx: int, command: str, report: Dict, total: Optional[int] = None,
+                        on_output: Optional[Callable[[str], None]] = None,
+                        session: Optional[LLMSession] = None) -> bool:
+        """Run one command, fixing failures as the retry policy decides; False once it stops or runs out of attempts"""
+        print(f"\n{'='*60}")
+        print(f"Command {cmd_idx}{f'/{total}' if total else ''}: {command}")
+        print(f"{'='*60}")
+        
+        failure = None  # (command, stderr, fix came from the fix cache) of the previous failed attempt
+        failed_attempts: List[Dict] = []
+        for attempt in range(1, self.max_attempts + 1):
+            print(f"\n🔄 Attempt {attempt}/{self.max_attempts}")
+            
+            if on_output:
+                on_output(f"$ {command}")
+            start = time.monotonic()
+            info: Dict = {}
+            success, stdout, stderr = self.execute_command(command, on_output, info)
+            
+            attempt_data = {
+                "step": cmd_idx,
+                "attempt": attempt,
+                "command": command,
+                "success": success,
+                "stdout": stdout,  # Already bounded to head + tail by OUTPUT_LIMITS
+                "stderr": stderr,
+                "duration_s": time.monotonic() - start,
+                "exit_status": info["exit_status"]
+            }
+            report["attempts"].append(attempt_data)
+            
+            if success:
+                print(f"✅ Command succeeded!")
+                if stdout:
+                    print(f"Output: {stdout[:200]}")
+                if failure and self.fix_cache:
+                    # Learn the fix so the next identical failure skips the LLM
+                    self.fix_cache.learn(failure[0], failure[1], command)
+                return True
+            
+            print(f"❌ Command failed: {stderr[:200]}")
+            if failure and failure[2] and self.fix_cache:
+                self.fix_cache.forget(failure[0], failure[1])  # The cached fix did not work
+            
+            if attempt == self.max_attempts:
+                attempt_data["decision"] = {"class": classify(stderr), "action": STOP, "delay": 0.0,
+                                            "reason": "max attempts reached"}
+                print(f"\n❌ Max attempts reached for this command")
+                report["final_status"] = "failed"
+                report["summary"] = f"Failed after {self.max_attempts} attempts. Last error: {stderr[:200]}"
+                return False
+            
+            decision = self.retry_policy.decide(command, stderr, failed_attempts)
+            fix = None
+            from_cache = False
+            if decision["action"] == ASK_LLM:
+                # Known failures are fixed from the cache without an LLM round trip
+                fix = self.fix_cache.lookup(command, stderr) if self.fix_cache else None
+                from_cache = fix is not None
+                if fix:
+                    print(f"\n⚡ Known error, using cached fix: {fix}")
+                    attempt_data["fix_source"] = "cache"
+                else:
+                    # Analyze error and get fix
+                    print(f"\n🔍 Analyzing error...")
+                    attempt_data["llm"] = {}
+                    fix_response = self.analyze_error(command, stderr, attempt, session, attempt_data["llm"])
+                    print(f"💡 LLM suggests:\n{fix_response[:300]}")
+                    attempt_data["fix_source"] = "llm"
+                    
+                    # Extract new command from fix
+                    new_commands = self.extract_commands(fix_response)
+                    fix = new_commands[0] if new_commands else None  # Try first suggested fix
+                decision = self.retry_policy.check_fix(decision, fix, command, stderr, failed_attempts)
+            
+            attempt_data["decision"] = decision
+            failed_attempts.append(attempt_data)
+            failure = (command, stderr, from_cache)
+            
+            if decision["action"] == STOP:
+                print(f"\n🛑 Stopping: {decision['reason']}")
+                report["final_status"] = "failed"
+                report["summary"] = f"Stopped after {attempt} attempt(s): {decision['reason']}. Last error: {stderr[:200]}"
+                return False
+            elif decision["action"] == BACKOFF:
+                print(f"\n⏳ {decision['class'].capitalize()} error, retrying in {decision['delay']:.0f}s...")
+                time.sleep(decision["delay"])
+            elif decision["action"] == RETRY:
+                print(f"⚠️  No alternative command found, retrying same command...")
+            else:
+                command = fix
+                print(f"\n🔧 Trying alternative: {command}")
+        return False
+    
     def get_summary(self, report: Dict) -> str:
         """Generate human-readable summary with command outputs"""
         if report["final_status"] == "success":
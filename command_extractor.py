@@ -0,0 +1,126 @@
+"""
+Command Extractor - Pulls shell commands out of LLM responses, whole or while they stream
+"""
+import re
+from typing import FrozenSet, List, Optional
+
+# Programs whose name at the start of a line marks it as a command
+COMMAND_PREFIXES: FrozenSet[str] = frozenset([
+    # Package management
+    'sudo', 'apt', 'apt-get', 'apt-cache', 'dpkg', 'snap', 'systemctl',
+    'flatpak', 'add-apt-repository', 'update-alternatives',
+    # Network tools
+    'wget', 'curl', 'ping', 'netstat', 'ss', 'ip', 'ifconfig', 'nmcli',
+    'dig', 'nslookup', 'traceroute',
+    # Development
+    'git', 'pip', 'pip3', 'python', 'python3', 'node', 'npm', 'bash', 'sh', 'docker',
+    # File operations
+    'ls', 'cd', 'chmod', 'chown', 'chgrp', 'mkdir', 'rmdir', 'rm', 'cp', 'mv', 'ln', 'touch',
+    'cat', 'less', 'more', 'head', 'tail', 'nano', 'vi', 'vim', 'stat', 'tee',
+    # Search and text processing
+    'grep', 'find', 'sed', 'awk', 'sort', 'uniq', 'wc', 'xargs', 'diff',
+    # Compression
+    'tar', 'gzip', 'gunzip', 'zip', 'unzip', 'bzip2',
+    # System information
+    'df', 'du', 'free', 'top', 'htop', 'ps', 'lsblk', 'lsof', 'lscpu', 'lsusb', 'lspci',
+    'uname', 'uptime', 'who', 'whoami', 'id', 'hostname', 'hostnamectl', 'timedatectl',
+    'lsb_release', 'nproc', 'journalctl',
+    # Users and scheduling
+    'useradd', 'usermod', 'passwd', 'crontab',
+    # Process management
+    'kill', 'killall', 'pkill', 'service', 'jobs', 'bg', 'fg',
+    # Other common commands
+    'echo', 'date', 'cal', 'which', 'whereis', 'man', 'ufw',
+    'install', 'gpg', 'ssh', 'scp', 'rsync', 'mount', 'umount'
+])
+
+# The program word of a simple command: skips leading VAR=value assignments and
+# stops at whitespace or shell metacharacters, so "df -h|head" and
+# "DEBIAN_FRONTEND=noninteractive apt-get install -y vim" name df and apt-get
+PROGRAM_RE = re.compile(r"(?:[A-Za-z_][A-Za-z0-9_]*=\S*\s+)*([^\s;|&<>()]+)")
+NUMBERED_RE = re.compile(r"\d+\.\s+")
+INLINE_CODE_RE = re.compile(r"`([^`]+)`")  # Leading inline-code span
+
+
+def program_name(line: str) -> str:
+    """The program a command line runs, or '' if there is none"""
+    match = PROGRAM_RE.match(line)
+    return match.group(1) if match else ''
+
+
+class StreamingCommandParser:
+    """
+    Incremental command extraction: feed LLM output as it streams and get each
+    command back as soon as its line is complete
+    """
+
+    def __init__(self, command_prefixes: FrozenSet[str] = COMMAND_PREFIXES):
+        self.command_prefixes = command_prefixes
+        self.in_code_block = False
+        self.buffer = ""
+
+    def feed(self, chunk: str) -> List[str]:
+        """Add streamed text; returns commands from the lines it completed"""
+        self.buffer += chunk
+        if '\n' not in chunk:
+            return []
+        *lines, self.buffer = self.buffer.split('\n')
+        parse_line = self.parse_line
+        return [command for command in map(parse_line, lines) if command]
+
+    def close(self) -> List[str]:
+        """Flush the last, unterminated line"""
+        line, self.buffer = self.buffer, ""
+        command = self.parse_line(line)
+        return [command] if command else []
+
+    def parse_line(self, line: str) -> Optional[str]:
+        """Return the command on a line, if any, tracking code block state"""
+        line = line.strip()
+
+        # Skip empty lines
+        if not line:
+            return None
+
+        first = line[0]
+
+        if first == '`':
+            # Handle code blocks
+            if line.startswith('```'):
+                self.in_code_block = not self.in_code_block
+                return None
+            # Inline code at the start of the line: `df -h`, or `df -h` shows disk usage
+            match = INLINE_CODE_RE.match(line)
+            if not match or not match.group(1).strip():
+                return None
+            line = match.group(1).strip()
+            first = line[0]
+
+        # A "$ " prompt marks a command inside or outside code blocks; outside,
+        # so does a bare "$"
+        if first == '$':
+            if line.startswith('$ ') or not self.in_code_block:
+                return line[1:].strip() or None
+            return None
+
+        # Comments and Markdown headings are never commands
+        if first == '#':
+            return None
+
+        if program_name(line) in self.command_prefixes:
+            return line
+
+        # Numbered lists (e.g., "1. sudo apt install...") outside code blocks
+        if not self.in_code_block and first.isdigit():
+            match = NUMBERED_RE.match(line)
+            if match and ' ' in line[match.end():]:
+                cmd_part = line[match.end():]
+                if program_name(cmd_part) in self.command_prefixes:
+                    return cmd_part
+        return None
+
+
+def extract_commands(text: str, command_prefixes: FrozenSet[str] = COMMAND_PREFIXES) -> List[str]:
+    """Extract shell commands from a complete LLM response"""
+    parser = StreamingCommandParser(command_prefixes)
+    return parser.feed(text) + parser.close()
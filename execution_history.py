@@ -0,0 +1,167 @@
+"""
+Execution History - Bounded SQLite (WAL) log of every command attempt, indexed for fast lookups by command, request and time
+"""
+import hashlib
+import time
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional
+from command_cache import CACHE_DIR, normalize_request
+from command_extractor import program_name
+from fix_cache import signature
+from retry_policy import classify
+
+DEFAULT_MAX_RUNS = 20000  # Months of interactive use; oldest runs (and their attempts) are dropped first
+
+
+def digest(text: str) -> str:
+    """Short fingerprint of (bounded) command output, to tell runs with identical output apart without storing it"""
+    return hashlib.sha1(text.encode("utf-8", "replace")).hexdigest()[:16] if text else ""
+
+
+class ExecutionHistory:
+    """
+    One row per execute_with_retry run (runs) and per command attempt
+    (attempts). Output is kept as digests only. WAL mode lets other
+    components read while a worker writes, and with synchronous=NORMAL a
+    request's inserts cost one unsynced commit.
+    """
+
+    def __init__(self, path: Optional[str] = None, max_runs: int = DEFAULT_MAX_RUNS):
+        self.path = Path(path) if path else CACHE_DIR / "history.sqlite3"
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_runs = max_runs
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS runs (
+                    id INTEGER PRIMARY KEY,
+                    time REAL NOT NULL,
+                    request TEXT NOT NULL,  -- Normalized, as in the command cache
+                    source TEXT NOT NULL,   -- fast_path, cache or llm
+                    final_status TEXT NOT NULL,
+                    duration_s REAL
+                )""")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS attempts (
+                    run_id INTEGER NOT NULL,
+                    step INTEGER NOT NULL,     -- Index of the command in the run
+                    attempt INTEGER NOT NULL,
+                    time REAL NOT NULL,
+                    command TEXT NOT NULL,
+                    program TEXT NOT NULL,
+                    success INTEGER NOT NULL,
+                    exit_status INTEGER,       -- NULL if it timed out or could not start
+                    duration_s REAL,
+                    failure_class TEXT,
+                    error_signature TEXT,      -- fix_cache.signature of stderr
+                    action TEXT,               -- Retry policy decision after a failure
+                    fix_source TEXT,
+                    stdout_digest TEXT NOT NULL,
+                    stderr_digest TEXT NOT NULL
+                )""")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS runs_request ON runs (request, time)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS runs_time ON runs (time)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS attempts_run ON attempts (run_id, step, attempt)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS attempts_command ON attempts (command, time)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS attempts_time ON attempts (time)")
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS attempts_signature ON attempts (error_signature) "
+                "WHERE error_signature IS NOT NULL")
+
+    def record(self, report: Dict) -> int:
+        """Store an execution report and its attempts; returns the run id"""
+        now = time.time()
+        rows = []
+        for a in report.get("attempts", []):
+            if "step" not in a:
+                continue  # Placeholder attempt, nothing was run
+            failed = not a["success"]
+            rows.append((
+                a["step"], a["attempt"], now, a["command"], program_name(a["command"]), int(a["success"]),
+                a.get("exit_status"), a.get("duration_s"),
+                classify(a["stderr"]) if failed else None,
+                signature(a["stderr"])[0] if failed else None,
+                a.get("decision", {}).get("action"), a.get("fix_source"),
+                digest(a["stdout"]), digest(a["stderr"]),
+            ))
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "INSERT INTO runs (time, request, source, final_status, duration_s) VALUES (?, ?, ?, ?, ?)",
+                (now, normalize_request(report["request"]), report.get("source", "llm"),
+                 report.get("final_status", "failed"), report.get("timings", {}).get("total_s"))
+            )
+            run_id = cursor.lastrowid
+            self._conn.executemany("""
+                INSERT INTO attempts (run_id, step, attempt, time, command, program, success, exit_status,
+                                      duration_s, failure_class, error_signature, action, fix_source,
+                                      stdout_digest, stderr_digest)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, [(run_id, *row) for row in rows])
+            # Ids only grow, so the cutoff is a range delete on the primary key / run index
+            cutoff = run_id - self.max_runs
+            if cutoff > 0:
+                self._conn.execute("DELETE FROM runs WHERE id <= ?", (cutoff,))
+                self._conn.execute("DELETE FROM attempts WHERE run_id <= ?", (cutoff,))
+        return run_id
+
+    def recent_runs(self, limit: int = 20) -> List[Dict]:
+        """Latest runs, newest first"""
+        return self._query("SELECT * FROM runs ORDER BY time DESC LIMIT ?", (limit,))
+
+    def runs_for(self, request: str, limit: int = 10) -> List[Dict]:
+        """Latest runs of a request (normalized like the command cache), newest first"""
+        return self._query("SELECT * FROM runs WHERE request = ? ORDER BY time DESC LIMIT ?",
+                           (normalize_request(request), limit))
+
+    def attempts(self, run_id: int) -> List[Dict]:
+        return self._query("SELECT * FROM attempts WHERE run_id = ? ORDER BY step, attempt", (run_id,))
+
+    def successful_commands(self, request: str) -> List[str]:
+        """Commands that completed the latest successful run of the request, in order"""
+        rows = self._query("""
+            SELECT command FROM attempts WHERE success = 1 AND run_id = (
+                SELECT id FROM runs WHERE request = ? AND final_status = 'success' ORDER BY time DESC LIMIT 1)
+            ORDER BY step
+        """, (normalize_request(request),))
+        return [row["command"] for row in rows]
+
+    def command_stats(self, command: str, since: float = 0.0) -> Dict:
+        """Run count, success rate and timing of a command (exact text) since a Unix time"""
+        (row,) = self._query("""
+            SELECT COUNT(*) AS runs, COALESCE(SUM(success), 0) AS successes, AVG(duration_s) AS mean_duration_s,
+                   MAX(time) AS last_run, MAX(CASE WHEN success THEN time END) AS last_success
+            FROM attempts WHERE command = ? AND time >= ?
+        """, (command, since))
+        row["success_rate"] = row["successes"] / row["runs"] if row["runs"] else 0.0
+        return row
+
+    def fixes_for(self, stderr: str, limit: int = 5) -> List[Dict]:
+        """Commands that later succeeded in the same step after a failure with this error signature, most frequent first"""
+        sig, _ = signature(stderr)
+        return self._query("""
+            SELECT fix.command AS command, COUNT(*) AS count FROM attempts AS failed
+            JOIN attempts AS fix ON fix.run_id = failed.run_id AND fix.step = failed.step
+                                AND fix.attempt > failed.attempt AND fix.success = 1
+            WHERE failed.error_signature = ?
+            GROUP BY fix.command ORDER BY count DESC, MAX(fix.time) DESC LIMIT ?
+        """, (sig, limit))
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            (runs,) = self._conn.execute("SELECT COUNT(*) FROM runs").fetchone()
+            (attempts,) = self._conn.execute("SELECT COUNT(*) FROM attempts").fetchone()
+        return {"runs": runs, "attempts": attempts}
+
+    def _query(self, sql: str, params: tuple) -> List[Dict]:
+        with self._lock:
+            return [dict(row) for row in self._conn.execute(sql, params).fetchall()]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,195 @@
+"""
+Fast Path - Resolves common read-only system queries (disk, memory, uptime, ...) to fixed commands without the LLM
+"""
+import os
+import re
+import json
+import threading
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from search_index import STOP_WORDS, edit_distance, tokenize
+
+try:
+    import yaml
+except ImportError:  # Optional: JSON intent files still work
+    yaml = None
+
+INTENTS_FILE = os.environ.get("ASTRA_CHATBOT_INTENTS")  # Optional JSON/YAML file extending DEFAULT_INTENTS
+MIN_CONFIDENCE = 0.8
+MIN_FUZZY_LEN = 4  # Shorter words only match exactly ("ip" must not match "id")
+
+# Words a query may contain without making it any less of a match
+GENERIC_WORDS = STOP_WORDS | frozenset("""
+    check display see get list current currently system machine computer much many tell print
+    out view whats info information details status all now quick here is am have
+""".split())
+
+# Anything that changes the system goes to the LLM, even if it mentions a known topic
+MUTATING_RE = re.compile(
+    r"\b(install|uninstall|remove|delete|purge|kill|stop|start|restart|reboot|shutdown|clean|clear|"
+    r"change|set|create|make|mount|unmount|umount|format|enable|disable|update|upgrade|add|move|"
+    r"copy|rename|free\s+up|increase|reduce|fix|configure)\b"
+)
+
+# Phrases that borrow a known topic's word but ask something else ("is my system up to date" is not `date`)
+LLM_ONLY_RE = re.compile(
+    r"\b(up[\s-]+to[\s-]+date|out[\s-]+of[\s-]+date|outdated|updated|upgradable|upgradeable|"
+    r"updates|upgrades)\b"
+)
+
+# keywords: synonym groups that must all be present; optional: words that may also appear
+DEFAULT_INTENTS = [
+    {"name": "disk_space", "commands": ["df -h"],
+     "keywords": [["disk", "disks", "storage", "filesystem", "filesystems", "df"]],
+     "optional": ["space", "usage", "free", "full", "left", "used", "size", "available"]},
+    {"name": "memory", "commands": ["free -h"],
+     "keywords": [["memory", "ram", "mem", "swap"]],
+     "optional": ["free", "usage", "used", "available", "total", "left"]},
+    {"name": "uptime", "commands": ["uptime"],
+     "keywords": [["uptime", "booted"]],
+     "optional": ["long", "since", "time", "been", "running", "has"]},
+    {"name": "load_average", "commands": ["uptime"],
+     "keywords": [["load"], ["average", "avg"]],
+     "optional": ["cpu"]},
+    {"name": "kernel", "commands": ["uname -r"],
+     "keywords": [["kernel"]],
+     "optional": ["version", "release", "running"]},
+    {"name": "os_version", "commands": ["cat /etc/os-release"],
+     "keywords": [["os", "distro", "distribution", "ubuntu", "operating"]],
+     "optional": ["version", "release", "name", "running"]},
+    {"name": "ip_address", "commands": ["ip -brief address"],
+     "keywords": [["ip", "ipv4", "ipv6"]],
+     "optional": ["address", "addresses", "addr", "local"]},
+    {"name": "processes", "commands": ["ps aux --sort=-%cpu | head -n 15"],
+     "keywords": [["processes", "process", "ps", "tasks"]],
+     "optional": ["running", "top", "active"]},
+    {"name": "cpu_info", "commands": ["lscpu"],
+     "keywords": [["cpu", "cpus", "processor", "cores"]],
+     "optional": ["model", "type", "number", "count"]},
+    {"name": "hostname", "commands": ["hostname"],
+     "keywords": [["hostname"]],
+     "optional": ["name"]},
+    {"name": "current_user", "commands": ["whoami"],
+     "keywords": [["whoami", "username"]],
+     "optional": ["user", "current", "logged", "who"]},
+    {"name": "logged_in_users", "commands": ["who"],
+     "keywords": [["logged"], ["users", "who"]],
+     "optional": ["currently"]},
+    {"name": "date", "commands": ["date"],
+     "keywords": [["date"]],
+     "optional": ["time", "today", "day"]},
+    {"name": "block_devices", "commands": ["lsblk"],
+     "keywords": [["lsblk", "partitions", "partition", "block"]],
+     "optional": ["devices", "device", "drives", "disks"]},
+    {"name": "listening_ports", "commands": ["ss -tuln"],
+     "keywords": [["ports", "port", "listening"]],
+     "optional": ["open", "tcp", "udp", "listening"]},
+    {"name": "usb_devices", "commands": ["lsusb"],
+     "keywords": [["usb", "lsusb"]],
+     "optional": ["devices", "device", "connected"]},
+]
+
+
+def load_intents(path: str) -> List[Dict]:
+    """Read an intent list from a JSON or YAML file"""
+    with open(path, 'r', encoding='utf-8') as f:
+        if Path(path).suffix.lower() in ('.yaml', '.yml'):
+            if yaml is None:
+                raise RuntimeError("PyYAML is required for YAML intent files")
+            return yaml.safe_load(f) or []
+        return json.load(f)
+
+
+class FastPath:
+    """
+    Keyword intent matcher in front of the LLM.
+
+    A request matches an intent when every keyword group is present (exactly,
+    or within one edit for longer words). Confidence is the share of the
+    request's words explained by the intent, so extra detail such as a path or
+    package name drops it below MIN_CONFIDENCE and the request goes to the LLM.
+    """
+
+    def __init__(self, intents: Optional[List[Dict]] = None, intents_file: Optional[str] = INTENTS_FILE,
+                 min_confidence: float = MIN_CONFIDENCE):
+        intents = list(DEFAULT_INTENTS if intents is None else intents)
+        if intents_file:
+            try:
+                # Entries replace defaults of the same name; new names are added
+                overrides = {intent['name']: intent for intent in load_intents(intents_file)}
+                intents = [overrides.pop(i['name'], i) for i in intents] + list(overrides.values())
+            except Exception as e:
+                print(f"⚠️  Could not load intents from {intents_file}: {e}")
+
+        self.min_confidence = min_confidence
+        self.intents = [self._compile(intent) for intent in intents]
+        self.vocabulary = frozenset(w for intent in self.intents for w in intent['words'])
+        self.requests = 0
+        self.hits = 0
+        self.intent_hits: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._canonical = lru_cache(maxsize=4096)(self._canonical_word)
+
+    @staticmethod
+    def _compile(intent: Dict) -> Dict:
+        groups = [frozenset([g] if isinstance(g, str) else g) for g in intent.get('keywords', [])]
+        optional = frozenset(intent.get('optional', []))
+        return {
+            'name': intent['name'],
+            'commands': list(intent['commands']),
+            'groups': groups,
+            'words': optional.union(*groups),
+        }
+
+    def _canonical_word(self, word: str) -> Optional[str]:
+        """The vocabulary word a query word stands for, allowing one typo in longer words"""
+        if word in self.vocabulary:
+            return word
+        if len(word) < MIN_FUZZY_LEN:
+            return None
+        for candidate in self.vocabulary:
+            if len(candidate) >= MIN_FUZZY_LEN and edit_distance(word, candidate, 1) <= 1:
+                return candidate
+        return None
+
+    def match(self, request: str) -> Optional[Tuple[str, List[str], float]]:
+        """Best (intent name, commands, confidence) for the request, or None"""
+        text = request.lower()
+        if MUTATING_RE.search(text) or LLM_ONLY_RE.search(text):
+            return None
+        words = [w for w in tokenize(text) if w not in GENERIC_WORDS]
+        if not words:
+            return None
+        canonical = [self._canonical(w) for w in words]
+        present = set(c for c in canonical if c)
+
+        best = None
+        for intent in self.intents:
+            if not intent['groups'] or not all(group & present for group in intent['groups']):
+                continue
+            explained = sum(1 for c in canonical if c in intent['words'])
+            confidence = explained / len(words)
+            if best is None or confidence > best[2]:
+                best = (intent['name'], intent['commands'], confidence)
+        return best
+
+    def resolve(self, request: str) -> Optional[Tuple[str, List[str]]]:
+        """(intent name, commands) when the match is confident enough, else None; counts hit rates"""
+        result = self.match(request)
+        hit = result is not None and result[2] >= self.min_confidence
+        with self._lock:
+            self.requests += 1
+            if hit:
+                self.hits += 1
+                self.intent_hits[result[0]] = self.intent_hits.get(result[0], 0) + 1
+        return (result[0], list(result[1])) if hit else None
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "hits": self.hits,
+                "hit_rate": self.hits / self.requests if self.requests else 0.0,
+                "intents": dict(self.intent_hits),
+            }
@@ -0,0 +1,184 @@
+"""
+Fix Cache - Persistent map from normalized error signatures to fix command templates, learned from successful retries
+"""
+import re
+import time
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from command_cache import CACHE_DIR
+from command_extractor import program_name
+
+DEFAULT_MAX_ENTRIES = 1000
+SIGNATURE_LINES = 3  # Leading meaningful stderr lines that make up a signature
+
+# Lines that say nothing about the failure
+NOISE_RE = re.compile(r"^(WARNING: apt does not have a stable CLI interface.*|\s*)$")
+
+# (pattern, placeholder) applied in order; the matched text becomes a template parameter
+PLACEHOLDERS = [
+    (re.compile(r"'([^'\n]+)'|\"([^\"\n]+)\"|‘([^’\n]+)’"), "<str>"),
+    (re.compile(r"(?<![\w.])(?:~|\.{1,2})?/[^\s:'\"(),]*[^\s:'\"(),.]"), "<path>"),
+    (re.compile(r"(?<=\blocate package )(\S+)|(?<=\bPackage )(\S+)(?= is not available| has no installation)"),
+     "<pkg>"),
+    (re.compile(r"([^\s:]+)(?=: command not found)"), "<cmd>"),
+    (re.compile(r"\b(\d+(?:\.\d+)*)\b"), "<n>"),
+]
+
+# Fixes that hold before anything has been learned; {cmd} is the failing command
+BUILTIN_FIXES = [
+    (re.compile(r"Permission denied|are you root\?|must be run as root|Operation not permitted", re.I),
+     "sudo {cmd}"),
+    (re.compile(r"Unable to locate package"), "sudo apt-get update && {cmd}"),
+]
+
+
+def signature(stderr: str) -> Tuple[str, List[str]]:
+    """Normalize stderr into (signature, parameters): variable parts become placeholders, in order"""
+    lines = []
+    params: List[str] = []
+    for line in stderr.splitlines():
+        if NOISE_RE.match(line):
+            continue
+        for pattern, placeholder in PLACEHOLDERS:
+            def replace(match, placeholder=placeholder):
+                params.append(next(g for g in match.groups() if g is not None) if match.groups() else match.group(0))
+                return placeholder
+            line = pattern.sub(replace, line)
+        line = " ".join(line.split())
+        if line not in lines:
+            lines.append(line)
+        if len(lines) == SIGNATURE_LINES:
+            break
+    return "\n".join(lines), params
+
+
+def command_key(command: str) -> str:
+    """The program a fix is learned for: "sudo apt-get install x" -> apt-get"""
+    words = command.split()
+    while words and (words[0] == 'sudo' or words[0].startswith('-')):
+        words = words[1:]
+    return program_name(" ".join(words))
+
+
+def _segment_re(command: str) -> "re.Pattern":
+    """The command as a whole segment of a command line: bounded by the ends, whitespace, &&, ; or |"""
+    return re.compile(rf"(?:^|(?<=\s)|(?<=&&)|(?<=;)|(?<=\|)){re.escape(command)}(?=$|\s|&&|;|\|)")
+
+
+def make_template(fix: str, command: str, params: List[str]) -> str:
+    """Turn a concrete fix into a template: the failing command becomes {cmd}, parameters become {0}, {1}, ..."""
+    template = fix.replace("{", "{{").replace("}", "}}")
+    if command:
+        # Not inside a longer word: "apt install vim" in "sudo apt install vim-gtk3" is not the command
+        escaped = command.replace("{", "{{").replace("}", "}}")
+        template = _segment_re(escaped).sub("{cmd}", template)
+    # Longest values first, so "/var/lib/dpkg/lock" is not split by a shorter "lock" parameter
+    for i in sorted(range(len(params)), key=lambda i: -len(params[i])):
+        value = params[i]
+        if len(value) < 2 or value.isdigit() and len(value) < 3:
+            continue  # Too short to be told apart from ordinary text
+        template = re.sub(rf"(?<![\w./-]){re.escape(value)}(?![\w/-])", f"{{{i}}}", template)
+    return template
+
+
+class FixCache:
+    """
+    Error signature -> fix template cache, keyed on the failing program (or the
+    whole command, for fixes without parameters) and the normalized stderr
+    signature. Learned when a failed attempt is followed by a successful
+    different command; forgotten when a cached fix fails.
+    """
+
+    def __init__(self, path: Optional[str] = None, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.path = Path(path) if path else CACHE_DIR / "fixes.sqlite3"
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS fixes (
+                    program TEXT NOT NULL,  -- Program name, or the whole command
+                    signature TEXT NOT NULL,
+                    template TEXT NOT NULL,
+                    successes INTEGER NOT NULL DEFAULT 1,
+                    last_used REAL NOT NULL,
+                    PRIMARY KEY (program, signature)
+                )""")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS fixes_last_used ON fixes (last_used)")
+
+    def lookup(self, command: str, stderr: str) -> Optional[str]:
+        """A fix for this failure from learned templates or BUILTIN_FIXES, or None"""
+        sig, params = signature(stderr)
+        with self._lock, self._conn:
+            # A fix learned for this exact command first, then one for any use of the program
+            for key in (command, command_key(command)):
+                row = self._conn.execute(
+                    "SELECT template FROM fixes WHERE program = ? AND signature = ?", (key, sig)
+                ).fetchone()
+                if row is not None:
+                    self._conn.execute(
+                        "UPDATE fixes SET last_used = ? WHERE program = ? AND signature = ?", (time.time(), key, sig)
+                    )
+                    break
+        templates = [row[0]] if row else []
+        templates += [template for pattern, template in BUILTIN_FIXES if pattern.search(stderr)]
+
+        for template in templates:
+            try:
+                fix = template.format(*params, cmd=command)
+            except (IndexError, KeyError, ValueError):
+                continue  # Learned from a failure with more parameters
+            if fix != command and not (template.startswith("sudo {cmd}") and command.startswith("sudo ")):
+                with self._lock:
+                    self.hits += 1
+                return fix
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def learn(self, command: str, stderr: str, fix: str):
+        """Remember that `fix` worked after `command` failed with `stderr`"""
+        if fix == command:
+            return  # Same command succeeding later is a transient failure, not a fix
+        sig, params = signature(stderr)
+        if not sig:
+            return
+        template = make_template(fix, command, params)
+        # A fix that refers to nothing in the failure ("dokcer ps" -> "docker ps"), or that changes the
+        # command itself ("apt install vim" -> "sudo apt install vim-gtk3"), only holds for that exact command
+        generic = re.search(r"\{(cmd|\d+)\}", template) and not (command in fix and "{cmd}" not in template)
+        key = command_key(command) if generic else command
+        with self._lock, self._conn:
+            self._conn.execute("""
+                INSERT INTO fixes (program, signature, template, last_used) VALUES (?, ?, ?, ?)
+                ON CONFLICT (program, signature) DO UPDATE SET
+                    successes = CASE WHEN template = excluded.template THEN successes + 1 ELSE 1 END,
+                    template = excluded.template, last_used = excluded.last_used
+            """, (key, sig, template, time.time()))
+            self._conn.execute(
+                "DELETE FROM fixes WHERE rowid IN ("
+                "SELECT rowid FROM fixes ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+
+    def forget(self, command: str, stderr: str):
+        """Drop the learned fix for this failure (it did not work this time)"""
+        sig, _ = signature(stderr)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM fixes WHERE program IN (?, ?) AND signature = ?", (command, command_key(command), sig)
+            )
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            (entries,) = self._conn.execute("SELECT COUNT(*) FROM fixes").fetchone()
+        return {"entries": entries, "hits": self.hits, "misses": self.misses}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
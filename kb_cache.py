@@ -0,0 +1,139 @@
+"""
+Knowledge Base Cache - Compact binary, memory-mapped cache file for extracted pages and search indexes
+
+File layout (native byte order, recorded in the header):
+
+    MAGIC | uint32 header length | JSON header | padding | section | padding | section ...
+
+The JSON header holds free-form metadata plus a table of named sections
+({name: [offset, length, typecode]}). Sections are raw array bytes, so on load
+they are exposed as zero-copy memoryviews over the mmap instead of Python objects.
+"""
+import os
+import sys
+import json
+import mmap
+import struct
+from array import array
+from typing import Dict, Iterator, List, Tuple, Union
+
+MAGIC = b"ASTRAKB\x01"
+ALIGNMENT = 8
+
+SectionData = Union[array, bytes]
+
+
+class CacheFormatError(Exception):
+    """Raised when a cache file is missing, truncated or from another format"""
+
+
+def _padding(offset: int) -> int:
+    return -offset % ALIGNMENT
+
+
+def write_cache(path: os.PathLike, meta: Dict, sections: Dict[str, SectionData]) -> None:
+    """Write metadata and named array/bytes sections atomically to `path`"""
+    table = {}
+    offset = 0
+    for name, data in sections.items():
+        typecode = data.typecode if isinstance(data, array) else 'B'
+        size = len(data) * data.itemsize if isinstance(data, array) else len(data)
+        table[name] = [offset, size, typecode]
+        offset += size + _padding(size)
+
+    header = json.dumps(
+        {'meta': meta, 'byteorder': sys.byteorder, 'sections': table},
+        ensure_ascii=False
+    ).encode('utf-8')
+    prefix = MAGIC + struct.pack('<I', len(header)) + header
+    prefix += b"\0" * _padding(len(prefix))
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(prefix)
+        for data in sections.values():
+            raw = data.tobytes() if isinstance(data, array) else bytes(data)
+            f.write(raw)
+            f.write(b"\0" * _padding(len(raw)))
+    os.replace(tmp_path, path)
+
+
+def read_cache(path: os.PathLike) -> Tuple[Dict, Dict[str, memoryview]]:
+    """Memory-map a cache file and return (meta, {name: memoryview})"""
+    with open(path, 'rb') as f:
+        try:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # Empty file
+            raise CacheFormatError("empty cache file")
+
+    if mm[:len(MAGIC)] != MAGIC:
+        raise CacheFormatError("not a knowledge base cache file")
+
+    (header_len,) = struct.unpack_from('<I', mm, len(MAGIC))
+    start = len(MAGIC) + 4
+    header = json.loads(mm[start:start + header_len].decode('utf-8'))
+    if header.get('byteorder') != sys.byteorder:
+        raise CacheFormatError("cache was written on a machine with another byte order")
+
+    base = start + header_len
+    base += _padding(base)
+    view = memoryview(mm)
+    sections = {}
+    for name, (offset, size, typecode) in header['sections'].items():
+        if base + offset + size > len(mm):
+            raise CacheFormatError(f"section {name!r} is truncated")
+        section = view[base + offset:base + offset + size]
+        sections[name] = section.cast(typecode) if typecode != 'B' else section
+
+    return header['meta'], sections
+
+
+class PageStore:
+    """Page texts kept as one UTF-8 blob plus an offset table, decoded only on access"""
+
+    def __init__(self, numbers, offsets, blob):
+        self.numbers = numbers  # PDF page number of each stored page
+        self.offsets = offsets  # len(numbers) + 1 byte offsets into blob
+        self.blob = blob
+
+    @classmethod
+    def from_pages(cls, pages: List[Dict]) -> "PageStore":
+        """Build a store from [{'page': n, 'text': str}, ...]"""
+        numbers = array('I')
+        offsets = array('Q', [0])
+        chunks = []
+        size = 0
+        for page_data in pages:
+            raw = page_data['text'].encode('utf-8')
+            numbers.append(page_data['page'])
+            chunks.append(raw)
+            size += len(raw)
+            offsets.append(size)
+        return cls(numbers, offsets, b"".join(chunks))
+
+    @classmethod
+    def from_sections(cls, sections: Dict[str, memoryview], prefix: str = "pages.") -> "PageStore":
+        return cls(sections[prefix + 'numbers'], sections[prefix + 'offsets'], sections[prefix + 'text'])
+
+    def to_sections(self, prefix: str = "pages.") -> Dict[str, SectionData]:
+        return {
+            prefix + 'numbers': array('I', self.numbers),
+            prefix + 'offsets': array('Q', self.offsets),
+            prefix + 'text': bytes(self.blob),
+        }
+
+    def __len__(self) -> int:
+        return len(self.numbers)
+
+    def __getitem__(self, i: int) -> Dict:
+        return {'page': self.page_number(i), 'text': self.text(i)}
+
+    def __iter__(self) -> Iterator[Dict]:
+        for i in range(len(self)):
+            yield self[i]
+
+    def page_number(self, i: int) -> int:
+        return self.numbers[i]
+
+    def text(self, i: int) -> str:
+        return bytes(self.blob[self.offsets[i]:self.offsets[i + 1]]).decode('utf-8')
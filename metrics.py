@@ -0,0 +1,175 @@
+"""
+Metrics - Per-stage timings and Ollama token throughput for execution reports, exported as JSONL or Prometheus text
+"""
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+METRICS_FILE = os.environ.get("ASTRA_CHATBOT_METRICS")  # *.prom -> Prometheus text, anything else -> JSONL
+
+def llm_stats(data: Dict, wall_s: float) -> Dict:
+    """Token counts and durations (seconds) of one Ollama call from its final response (Ollama reports nanoseconds)"""
+    stats = {
+        "wall_s": wall_s,
+        "prompt_eval_count": data.get("prompt_eval_count", 0),
+        "prompt_eval_s": data.get("prompt_eval_duration", 0) / 1e9,
+        "eval_count": data.get("eval_count", 0),
+        "eval_s": data.get("eval_duration", 0) / 1e9,
+        "load_s": data.get("load_duration", 0) / 1e9,
+    }
+    stats["tokens_per_s"] = stats["eval_count"] / stats["eval_s"] if stats["eval_s"] else 0.0
+    return stats
+
+
+class Timings:
+    """
+    Stage timer for one request, on the monotonic clock.
+
+    Stages may run on several threads (parallel commands), so a stage's
+    seconds are the sum over its calls and can exceed the request's wall time.
+    """
+
+    def __init__(self):
+        self.start = time.monotonic()
+        self.stages: Dict[str, Dict[str, float]] = {}
+        self.llm_calls: List[Dict] = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.add(name, time.monotonic() - start)
+
+    def add(self, name: str, seconds: float):
+        with self._lock:
+            stage = self.stages.setdefault(name, {"seconds": 0.0, "count": 0})
+            stage["seconds"] += seconds
+            stage["count"] += 1
+
+    def add_llm(self, stats: Optional[Dict]):
+        """
+        Record one LLM call (llm_stats output); its wall time counts towards the llm stage.
+        A call that failed has no stats, but the fix-up's context retrieval (retrieval_s) still counts.
+        """
+        if not stats:
+            return
+        if "retrieval_s" in stats:
+            self.add("retrieval", stats["retrieval_s"])
+        if "wall_s" in stats:
+            with self._lock:
+                self.llm_calls.append(stats)
+            self.add("llm", stats["wall_s"])
+
+    def summary(self, attempts: List[Dict]) -> Dict:
+        """report["timings"]: stage totals, plus command and fix-up LLM time taken from the attempts"""
+        for attempt in attempts:
+            if "duration_s" in attempt:
+                self.add("execute", attempt["duration_s"])
+            self.add_llm(attempt.get("llm"))
+        calls = self.llm_calls
+        eval_s = sum(c.get("eval_s", 0.0) for c in calls)
+        eval_count = sum(c.get("eval_count", 0) for c in calls)
+        return {
+            "total_s": time.monotonic() - self.start,
+            "stages": {name: dict(stage) for name, stage in self.stages.items()},
+            "llm": {
+                "calls": len(calls),
+                "prompt_eval_count": sum(c.get("prompt_eval_count", 0) for c in calls),
+                "prompt_eval_s": sum(c.get("prompt_eval_s", 0.0) for c in calls),
+                "eval_count": eval_count,
+                "eval_s": eval_s,
+                "load_s": sum(c.get("load_s", 0.0) for c in calls),
+                "tokens_per_s": eval_count / eval_s if eval_s else 0.0,
+            },
+        }
+
+
+class MetricsExporter:
+    """
+    Appends one JSON line per request (JSONL), or keeps running totals and
+    rewrites a Prometheus text exposition file after each request (*.prom).
+    """
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.prometheus = self.path.suffix == ".prom"
+        self.requests: Dict[tuple, int] = {}
+        self.request_seconds = 0.0
+        self.stage_seconds: Dict[str, float] = {}
+        self.stage_count: Dict[str, int] = {}
+        self.llm_totals: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> Optional["MetricsExporter"]:
+        return cls(METRICS_FILE) if METRICS_FILE else None
+
+    def record(self, report: Dict):
+        timings = report.get("timings")
+        if not timings:
+            return
+        with self._lock:
+            if self.prometheus:
+                self._aggregate(report, timings)
+                self._write_prometheus()
+            else:
+                line = {
+                    "time": time.time(),
+                    "request": report.get("request"),
+                    "status": report.get("final_status"),
+                    "source": report.get("source"),
+                    "attempts": len(report.get("attempts", [])),
+                    **timings,
+                }
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(line, ensure_ascii=False) + "\n")
+
+    def _aggregate(self, report: Dict, timings: Dict):
+        key = (report.get("final_status", ""), report.get("source", ""))
+        self.requests[key] = self.requests.get(key, 0) + 1
+        self.request_seconds += timings["total_s"]
+        for name, stage in timings["stages"].items():
+            self.stage_seconds[name] = self.stage_seconds.get(name, 0.0) + stage["seconds"]
+            self.stage_count[name] = self.stage_count.get(name, 0) + stage["count"]
+        for name, value in timings["llm"].items():
+            if name != "tokens_per_s":
+                self.llm_totals[name] = self.llm_totals.get(name, 0) + value
+
+    def _write_prometheus(self):
+        lines = [
+            "# HELP astra_requests_total Command requests by final status and command source",
+            "# TYPE astra_requests_total counter",
+        ]
+        lines += [f'astra_requests_total{{status="{status}",source="{source}"}} {count}'
+                  for (status, source), count in sorted(self.requests.items())]
+        lines += [
+            "# HELP astra_request_seconds_total Wall time spent in execute_with_retry",
+            "# TYPE astra_request_seconds_total counter",
+            f"astra_request_seconds_total {self.request_seconds:.6f}",
+            "# HELP astra_stage_seconds_total Time spent per execution stage",
+            "# TYPE astra_stage_seconds_total counter",
+        ]
+        lines += [f'astra_stage_seconds_total{{stage="{name}"}} {seconds:.6f}'
+                  for name, seconds in sorted(self.stage_seconds.items())]
+        lines += [
+            "# HELP astra_stage_calls_total Timed calls per execution stage",
+            "# TYPE astra_stage_calls_total counter",
+        ]
+        lines += [f'astra_stage_calls_total{{stage="{name}"}} {count}'
+                  for name, count in sorted(self.stage_count.items())]
+        for name, value in sorted(self.llm_totals.items()):
+            metric = f"astra_llm_{name[:-2] + '_seconds' if name.endswith('_s') else name}_total"
+            lines += [f"# TYPE {metric} counter", f"{metric} {value:.6f}" if isinstance(value, float) else f"{metric} {value}"]
+
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp_path, self.path)
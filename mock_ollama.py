@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+Mock Ollama - Local stand-in for the Ollama API (/api/generate, /api/chat, /api/tags) with scripted replies
+
+Replies come from rules matched against the prompt (or the last chat message);
+latency and token rate are simulated, and streamed replies are sent one token
+per NDJSON event like the real server. Used by benchmark_executor.py, or run it
+and point the app at it:
+
+    python mock_ollama.py --port 11435 --script replies.json --latency 0.2 --token-rate 80
+    OLLAMA_API=http://127.0.0.1:11435 python astra_chatbot.py
+
+A script is a JSON list of rules, first match wins:
+
+    [{"match": "Command that failed: cat", "response": "$ echo fixed"},
+     {"match": "disk", "response": "df -h", "latency": 0.5},
+     {"match": "broken", "response": "", "status": 500},
+     {"match": "noisy", "response": "ls", "garbage": true}]
+"""
+import argparse
+import json
+import re
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterator, List, Optional, Tuple
+
+DEFAULT_RESPONSE = "I'm not sure what you mean."
+DEFAULT_MODELS = ["qwen2.5:0.5b", "llama3.2:1b"]
+TOKEN_RE = re.compile(r"\s*\S+|\s+")  # Words with their leading whitespace, roughly one model token each
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_RE.findall(text)
+
+
+class MockOllama:
+    """
+    Threaded mock server. latency is the delay before the first token (prompt
+    evaluation), token_rate the tokens per second after it (None = no delay).
+    A rule may override response, latency and token_rate, set an HTTP error
+    status, or add non-JSON lines to its stream ("garbage").
+
+    Every request is kept in `requests` as (path, payload) for assertions.
+    """
+
+    def __init__(self, rules: Optional[List[Dict]] = None, default: str = DEFAULT_RESPONSE,
+                 latency: float = 0.0, token_rate: Optional[float] = None,
+                 models: Optional[List[str]] = None, host: str = "127.0.0.1", port: int = 0):
+        self.rules = [{**rule, "pattern": re.compile(rule["match"], re.I)} for rule in rules or []]
+        self.default = default
+        self.latency = latency
+        self.token_rate = token_rate
+        self.models = models or DEFAULT_MODELS
+        self.requests: List[Tuple[str, Dict]] = []
+        self._lock = threading.Lock()
+        self.server = _Server((host, port), _Handler)
+        self.server.mock = self
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "MockOllama":
+        self._thread = threading.Thread(target=self.server.serve_forever, name="mock-ollama", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self) -> "MockOllama":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def request_count(self, path: Optional[str] = None) -> int:
+        with self._lock:
+            return sum(1 for p, _ in self.requests if path is None or p == path)
+
+    def record(self, path: str, payload: Dict):
+        with self._lock:
+            self.requests.append((path, payload))
+
+    def reply(self, text: str) -> Dict:
+        """The rule for a prompt, with the server defaults filled in"""
+        for rule in self.rules:
+            if rule["pattern"].search(text):
+                break
+        else:
+            rule = {}
+        return {
+            "response": rule.get("response", self.default),
+            "latency": rule.get("latency", self.latency),
+            "token_rate": rule.get("token_rate", self.token_rate),
+            "status": rule.get("status", 200),
+            "garbage": rule.get("garbage", False),
+        }
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)  # Clients dropping keep-alive connections is normal
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, like Ollama; streams use chunked encoding
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        mock: MockOllama = self.server.mock
+        if self.path != "/api/tags":
+            return self._send_json({"error": "not found"}, 404)
+        mock.record(self.path, {})
+        now = datetime.now(timezone.utc).isoformat()
+        self._send_json({"models": [{"name": m, "model": m, "modified_at": now, "size": 0} for m in mock.models]})
+
+    def do_POST(self):
+        mock: MockOllama = self.server.mock
+        try:
+            payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        except ValueError:
+            return self._send_json({"error": "invalid JSON"}, 400)
+        if self.path == "/api/generate":
+            prompt = payload.get("prompt", "")
+        elif self.path == "/api/chat":
+            messages = payload.get("messages") or [{}]
+            prompt = messages[-1].get("content", "")
+        else:
+            return self._send_json({"error": "not found"}, 404)
+        mock.record(self.path, payload)
+
+        reply = mock.reply(prompt)
+        if reply["status"] != 200:
+            time.sleep(reply["latency"])
+            return self._send_json({"error": "mock failure"}, reply["status"])
+        events = self._events(payload, prompt, reply)
+        if payload.get("stream", True):  # Ollama streams unless told otherwise
+            self._send_stream(events, reply["garbage"])
+        else:
+            for event in events:
+                pass  # Same pacing as the stream; the last event carries the full reply
+            self._send_json(event)
+
+    def _events(self, payload: Dict, prompt: str, reply: Dict) -> Iterator[Dict]:
+        """Ollama's stream events for a reply: one per token, then the done event with the stats"""
+        chat = self.path == "/api/chat"
+        tokens = tokenize(reply["response"])
+        model = payload.get("model", "")
+        prompt_tokens = len(tokenize(prompt))
+        start = time.monotonic()
+        time.sleep(reply["latency"])
+        prompt_eval_s = time.monotonic() - start
+
+        streaming = payload.get("stream", True)
+        for token in tokens:
+            if reply["token_rate"]:
+                time.sleep(1 / reply["token_rate"])
+            if streaming:
+                event = {"model": model, "created_at": _now(), "done": False}
+                if chat:
+                    event["message"] = {"role": "assistant", "content": token}
+                else:
+                    event["response"] = token
+                yield event
+        eval_s = time.monotonic() - start - prompt_eval_s
+
+        done = {
+            "model": model,
+            "created_at": _now(),
+            "done": True,
+            "done_reason": "stop",
+            "total_duration": int((prompt_eval_s + eval_s) * 1e9),
+            "load_duration": 0,
+            "prompt_eval_count": prompt_tokens,
+            "prompt_eval_duration": int(prompt_eval_s * 1e9),
+            "eval_count": len(tokens),
+            "eval_duration": int(eval_s * 1e9),
+        }
+        full = "" if streaming else reply["response"]
+        if chat:
+            done["message"] = {"role": "assistant", "content": full}
+        else:
+            done["response"] = full
+            # Stands in for the token ids of the whole conversation so far
+            done["context"] = list(payload.get("context") or []) + list(range(prompt_tokens + len(tokens)))
+        yield done
+
+    def _send_json(self, data: Dict, status: int = 200):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_stream(self, events: Iterator[Dict], garbage: bool):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            for i, event in enumerate(events):
+                if garbage and i % 3 == 0:
+                    self._write_chunk(b"{not json\n")
+                self._write_chunk(json.dumps(event).encode("utf-8") + b"\n")
+            self._write_chunk(b"")
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True  # Client stopped reading, e.g. a cancelled chat
+
+    def _write_chunk(self, data: bytes):
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def load_script(path: str) -> List[Dict]:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--script", help="JSON list of reply rules")
+    parser.add_argument("--default", default=DEFAULT_RESPONSE, help="reply when no rule matches")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds before the first token")
+    parser.add_argument("--token-rate", type=float, help="tokens per second (default: no delay)")
+    args = parser.parse_args(argv)
+
+    mock = MockOllama(load_script(args.script) if args.script else None, args.default,
+                      args.latency, args.token_rate, host=args.host, port=args.port)
+    print(f"🧪 Mock Ollama listening on {mock.url}")
+    try:
+        mock.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        mock.server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,107 @@
+"""
+Ollama Client - One process-wide pooled HTTP client shared by the chat UI and the command executor
+"""
+import os
+import json
+import atexit
+import threading
+from typing import Dict, Iterator, List, Optional
+import httpx
+
+OLLAMA_API = os.environ.get("OLLAMA_API", "http://localhost:11434")
+CONNECT_TIMEOUT = 5.0   # Ollama is local: a slow connect means it isn't running
+READ_TIMEOUT = 60.0     # Small local models can take a while to produce a full answer
+POOL_LIMITS = httpx.Limits(max_connections=10, max_keepalive_connections=5, keepalive_expiry=120.0)
+
+_client: Optional[httpx.Client] = None
+_lock = threading.Lock()
+
+
+def get_client() -> httpx.Client:
+    """The shared keep-alive client, created on first use (httpx.Client is thread-safe)"""
+    global _client
+    with _lock:
+        if _client is None or _client.is_closed:
+            _client = httpx.Client(
+                base_url=OLLAMA_API,
+                timeout=httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT),
+                limits=POOL_LIMITS,
+            )
+        return _client
+
+
+def close_client() -> None:
+    """Close pooled connections; a later call to get_client() opens a fresh client"""
+    global _client
+    with _lock:
+        if _client is not None:
+            _client.close()
+            _client = None
+
+
+atexit.register(close_client)
+
+
+def configure(base_url: str) -> None:
+    """Point the shared client at another server (e.g. mock_ollama.py); later calls reconnect there"""
+    global OLLAMA_API, _client
+    with _lock:
+        if _client is not None:
+            _client.close()
+            _client = None
+        OLLAMA_API = base_url
+
+
+def is_available() -> bool:
+    try:
+        r = get_client().get("/api/tags", timeout=CONNECT_TIMEOUT)
+        return r.status_code == 200
+    except Exception:
+        return False
+
+
+def list_models() -> List[str]:
+    try:
+        r = get_client().get("/api/tags", timeout=CONNECT_TIMEOUT)
+        r.raise_for_status()
+        tags = r.json().get("models", [])
+        return [m.get("name") for m in tags if m.get("name")]
+    except Exception:
+        return []
+
+
+def generate(payload: Dict) -> Dict:
+    """POST /api/generate without streaming and return the decoded response"""
+    r = get_client().post("/api/generate", json={**payload, "stream": False})
+    r.raise_for_status()
+    return r.json()
+
+
+def generate_stream(payload: Dict) -> Iterator[Dict]:
+    """
+    Yield decoded /api/generate stream events; each carries the next `response` tokens.
+    READ_TIMEOUT applies per chunk, so a stalled model fails the request instead of hanging the executor.
+    """
+    return _stream("/api/generate", {**payload, "stream": True}, READ_TIMEOUT)
+
+
+def chat_stream(model: str, messages: List[Dict[str, str]]) -> Iterator[Dict]:
+    """Yield decoded /api/chat stream events until the final `done` event"""
+    # No read timeout: the gap between tokens is unbounded while the model thinks, and the user can cancel
+    return _stream("/api/chat", {"model": model, "messages": messages, "stream": True}, None)
+
+
+def _stream(path: str, payload: Dict, read_timeout: Optional[float]) -> Iterator[Dict]:
+    timeout = httpx.Timeout(read_timeout, connect=CONNECT_TIMEOUT)
+    with get_client().stream("POST", path, json=payload, timeout=timeout) as r:
+        r.raise_for_status()
+        for line in r.iter_lines():
+            if not line:
+                continue
+            try:
+                data = json.loads(line)
+            except Exception:
+                continue
+            yield data
+            if data.get("done"):
+                break
@@ -2,98 +2,485 @@
 PDF Knowledge Base - Extracts and searches command knowledge from Ubuntu Linux Toolbox PDF
 """
 import os
+import re
 import json
+import hashlib
+import multiprocessing
+from array import array
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
 import PyPDF2
+from kb_cache import PageStore, read_cache, write_cache
+from search_index import CommandIndex, InvertedIndex, QueryCache, TrigramIndex, normalize_query, split_passages, tokenize
+
+PASSAGE_SIZE = 400    # Characters per indexed passage
+PASSAGE_STRIDE = 200  # Passages overlap by half a window
+QUERY_CACHE_SIZE = 256
+COMMAND_SNIPPET_SIZE = 500  # Characters of a command's reference section returned
+DEFAULT_CONTEXT_TOKENS = 200  # Roughly the old fixed recipe of 2 passages x 400 characters
+MIN_SNIPPET_TOKENS = 30       # Smaller leftovers of the budget are not worth a snippet
+DUPLICATE_OVERLAP = 0.6       # Token-set Jaccard above which two snippets say the same thing
+FUZZY_MIN_HITS = 2  # Fewer exact hits than this falls back to typo-tolerant matching
+MIN_PAGES_PER_WORKER = 25  # Below this, process start-up costs more than it saves
+PAGE_DIGEST_SIZE = 16
+
+# Bump when extracted text would differ (forces re-extraction) or when the
+# cached index layout/tokenization changes (forces an index rebuild only)
+EXTRACTOR_VERSION = 1
+INDEX_VERSION = 4
+
+
+def _page_digest(page) -> bytes:
+    """Hash of a page's raw content stream - cheap compared to extract_text()"""
+    contents = page.get_contents()
+    data = contents.get_data() if contents is not None else b""
+    return hashlib.blake2b(data, digest_size=PAGE_DIGEST_SIZE).digest()
+
+
+def _extract_page_list(pdf_path: str, indices: List[int]) -> List[Tuple[int, str, bytes]]:
+    """Extract (index, text, digest) for pages - runs in a worker process with its own reader"""
+    pages = []
+    with open(pdf_path, 'rb') as f:
+        reader = PyPDF2.PdfReader(f)
+        for i in indices:
+            page = reader.pages[i]
+            pages.append((i, page.extract_text() or "", _page_digest(page)))
+    return pages
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate: about 4 characters per token for English and shell text"""
+    return (len(text) + 3) // 4
+
+
+def pack_context(candidates: List[Dict], token_budget: int) -> str:
+    """
+    Pack the highest-scoring, non-redundant snippets into at most `token_budget` tokens.
+    Candidates are result dicts with 'title', 'text', 'score' and, for passages,
+    'page'/'start'/'end' (plus 'source' from a sharded knowledge base).
+    Snippets that overlap or mostly repeat an already packed one are skipped and the
+    last snippet is cut at a word boundary to fit.
+    """
+    parts = []
+    packed = []
+    used = 0
+    last_title = None
+    
+    for candidate in sorted(candidates, key=lambda c: c['score'], reverse=True):
+        if token_budget - used < MIN_SNIPPET_TOKENS:
+            break
+        
+        overlaps = any(
+            p.get('source') == candidate.get('source') and p.get('page') == candidate.get('page')
+            and p.get('start', 0) < candidate.get('end', 0) and candidate.get('start', 0) < p.get('end', 0)
+            for p, _ in packed
+        )
+        tokens = set(tokenize(candidate['text']))
+        duplicate = any(
+            len(tokens & seen) > DUPLICATE_OVERLAP * len(tokens | seen)
+            for _, seen in packed
+        )
+        if overlaps or duplicate or not tokens:
+            continue
+        
+        # Squeeze layout whitespace but keep line breaks, which separate command examples
+        text = re.sub(r"[ \t]+", " ", candidate['text'])
+        text = re.sub(r"\n\s*\n+", "\n", text).strip()
+        header = f"Reference from {candidate['title']}:\n\n" if candidate['title'] != last_title else ""
+        room = token_budget - used - estimate_tokens(header + "\n\n")
+        if estimate_tokens(text) > room:
+            if room < MIN_SNIPPET_TOKENS:
+                continue
+            cut = text.rfind(" ", 0, room * 4)
+            text = text[:cut if cut > 0 else room * 4]
+        
+        parts.append(f"{header}{text}\n\n")
+        used += estimate_tokens(parts[-1])
+        packed.append((candidate, tokens))
+        last_title = candidate['title']
+    
+    return "".join(parts)
+
+
+def command_name(command: str) -> str:
+    """The program a shell command runs, skipping sudo and VAR=value prefixes"""
+    words = command.split()
+    while words and (words[0] == 'sudo' or '=' in words[0]):
+        words.pop(0)
+    return os.path.basename(words[0]) if words else ""
 
 class PDFKnowledgeBase:
-    def __init__(self, pdf_path: str):
+    title = "Ubuntu Linux Toolbox"  # Names the source in generated context
+    
+    def __init__(self, pdf_path: str, cache_dir: Optional[str] = None):
         self.pdf_path = Path(pdf_path)
-        self.cache_path = self.pdf_path.with_suffix('.cache.json')
-        self.content = []
+        if cache_dir:
+            # Sources may live in read-only locations; key the cache on the full path
+            Path(cache_dir).mkdir(parents=True, exist_ok=True)
+            path_hash = hashlib.sha1(str(self.pdf_path.resolve()).encode('utf-8')).hexdigest()[:12]
+            self.cache_path = Path(cache_dir) / f"{self.pdf_path.name}-{path_hash}.kbcache"
+        else:
+            self.cache_path = self.pdf_path.with_suffix('.kbcache')
+        self.legacy_cache_path = self.pdf_path.with_suffix('.cache.json')
+        self.content = PageStore.from_pages([])
+        self.page_hashes = b""  # PAGE_DIGEST_SIZE bytes per PDF page, empty pages included
+        self.index = InvertedIndex()
+        # Passage i covers content[passage_pages[i]].text[passage_starts[i]:passage_ends[i]]
+        self.passage_pages = array('I')
+        self.passage_starts = array('I')
+        self.passage_ends = array('I')
+        self.passage_index = InvertedIndex()
+        self.trigram_index = TrigramIndex()
+        self.command_index = CommandIndex.build([])
+        # Results keyed on the normalized query; cleared whenever the indexes change
+        self.query_cache = QueryCache(QUERY_CACHE_SIZE)
         self.load_or_extract()
     
     def load_or_extract(self):
         """Load from cache or extract from PDF"""
+        self.query_cache.clear()
         if self.cache_path.exists():
             try:
-                with open(self.cache_path, 'r', encoding='utf-8') as f:
-                    self.content = json.load(f)
-                print(f"✅ Loaded {len(self.content)} pages from cache")
-                return
+                if self.load_cache():
+                    print(f"✅ Loaded {len(self.content)} pages from cache")
+                    return
             except Exception as e:
                 print(f"⚠️  Cache load failed: {e}")
         
+        # Migrate the old JSON cache instead of re-extracting; once a binary cache exists
+        # (even an outdated one) the JSON text is older still and must not come back
+        elif self.legacy_cache_path.exists():
+            try:
+                with open(self.legacy_cache_path, 'r', encoding='utf-8') as f:
+                    self.content = PageStore.from_pages(json.load(f))
+                if self.pdf_path.exists():
+                    self.page_hashes = self._read_page_hashes()
+                self.build_index()
+                self.save_cache()
+                self.legacy_cache_path.rename(self.legacy_cache_path.with_name(self.legacy_cache_path.name + '.migrated'))
+                print(f"✅ Converted {len(self.content)} pages from JSON cache")
+                return
+            except Exception as e:
+                print(f"⚠️  JSON cache conversion failed: {e}")
+        
         # Extract from PDF
         self.extract_from_pdf()
     
+    def load_cache(self) -> bool:
+        """
+        Memory-map the binary cache; page text is decoded only when a result needs it.
+        The cache is checked against the PDF and versions: an index-only change
+        rebuilds the index, changed pages are re-extracted incrementally.
+        Returns False when the cache is unusable and everything must be re-extracted.
+        """
+        meta, sections = read_cache(self.cache_path)
+        if meta.get('extractor_version') != EXTRACTOR_VERSION:
+            print("⚠️  Cache was built by another extractor version")
+            return False
+        
+        self.content = PageStore.from_sections(sections)
+        self.page_hashes = bytes(sections['pdf.page_hashes'])
+        index_stale = meta.get('index_version') != INDEX_VERSION
+        
+        # Without the PDF the cache is all we have; same size and mtime means unchanged
+        pdf_changed = False
+        if self.pdf_path.exists():
+            stat = self.pdf_path.stat()
+            if (stat.st_size, stat.st_mtime_ns) != (meta.get('pdf_size'), meta.get('pdf_mtime_ns')):
+                pdf_changed = self._file_sha256() != meta.get('pdf_sha256')
+                # Touched but identical: fall through and refresh the recorded mtime
+                index_stale = index_stale or not pdf_changed
+        
+        if pdf_changed:
+            self.update_changed_pages()
+        elif index_stale:
+            self.build_index()
+            self.save_cache()
+        else:
+            self.index = InvertedIndex.from_sections(sections, 'index.')
+            self.passage_index = InvertedIndex.from_sections(sections, 'passages.')
+            self.trigram_index = TrigramIndex.from_sections(sections, 'trigrams.', self.index.terms)
+            self.command_index = CommandIndex.from_sections(sections, 'commands.')
+            self.passage_pages = sections['passages.pages']
+            self.passage_starts = sections['passages.starts']
+            self.passage_ends = sections['passages.ends']
+        return True
+    
+    def save_cache(self):
+        """Write pages and prebuilt indexes to the binary cache"""
+        meta = {
+            'source': self.pdf_path.name,
+            'extractor_version': EXTRACTOR_VERSION,
+            'index_version': INDEX_VERSION,
+            'page_count': len(self.page_hashes) // PAGE_DIGEST_SIZE,
+        }
+        if self.pdf_path.exists():
+            stat = self.pdf_path.stat()
+            meta.update({
+                'pdf_size': stat.st_size,
+                'pdf_mtime_ns': stat.st_mtime_ns,
+                'pdf_sha256': self._file_sha256(),
+            })
+        
+        sections = self.content.to_sections()
+        sections['pdf.page_hashes'] = self.page_hashes
+        sections.update(self.index.to_sections('index.'))
+        sections.update(self.passage_index.to_sections('passages.'))
+        sections.update(self.trigram_index.to_sections('trigrams.'))
+        sections.update(self.command_index.to_sections('commands.'))
+        sections['passages.pages'] = array('I', self.passage_pages)
+        sections['passages.starts'] = array('I', self.passage_starts)
+        sections['passages.ends'] = array('I', self.passage_ends)
+        write_cache(self.cache_path, meta, sections)
+    
+    def _file_sha256(self) -> str:
+        digest = hashlib.sha256()
+        with open(self.pdf_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+    
+    def _read_page_hashes(self) -> bytes:
+        with open(self.pdf_path, 'rb') as f:
+            return b"".join(_page_digest(page) for page in PyPDF2.PdfReader(f).pages)
+    
+    def _page_count(self) -> int:
+        with open(self.pdf_path, 'rb') as f:
+            return len(PyPDF2.PdfReader(f).pages)
+    
     def extract_from_pdf(self):
         """Extract text content from PDF"""
         try:
             print(f"📖 Extracting content from {self.pdf_path.name}...")
-            with open(self.pdf_path, 'rb') as f:
-                reader = PyPDF2.PdfReader(f)
-                total_pages = len(reader.pages)
-                
-                for i, page in enumerate(reader.pages):
-                    text = page.extract_text()
-                    if text.strip():
-                        self.content.append({
-                            'page': i + 1,
-                            'text': text
-                        })
-                    
-                    if (i + 1) % 50 == 0:
-                        print(f"  Processed {i + 1}/{total_pages} pages...")
+            total_pages = self._page_count()
+            extracted = self._extract_pages(list(range(total_pages)))
+            self.page_hashes = b"".join(extracted[i][1] for i in range(total_pages))
+            self.content = PageStore.from_pages([
+                {'page': i + 1, 'text': extracted[i][0]}
+                for i in range(total_pages)
+                if extracted[i][0].strip()
+            ])
+            self.build_index()
             
             # Save cache
-            with open(self.cache_path, 'w', encoding='utf-8') as f:
-                json.dump(self.content, f, ensure_ascii=False, indent=2)
+            self.save_cache()
             
             print(f"✅ Extracted {len(self.content)} pages and saved cache")
         
         except Exception as e:
             print(f"❌ PDF extraction failed: {e}")
-            self.content = []
+            self.content = PageStore.from_pages([])
+            self.build_index()
+    
+    def update_changed_pages(self):
+        """Re-extract only the pages whose content hash changed, then re-index"""
+        new_hashes = self._read_page_hashes()
+        total_pages = len(new_hashes) // PAGE_DIGEST_SIZE
+        
+        def digest(hashes: bytes, i: int) -> bytes:
+            return hashes[i * PAGE_DIGEST_SIZE:(i + 1) * PAGE_DIGEST_SIZE]
+        
+        changed = [i for i in range(total_pages) if digest(new_hashes, i) != digest(self.page_hashes, i)]
+        print(f"🔄 {self.pdf_path.name} changed: re-extracting {len(changed)}/{total_pages} pages...")
+        extracted = self._extract_pages(changed)
+        
+        cached = {self.content.page_number(i): i for i in range(len(self.content))}
+        pages = []
+        for i in range(total_pages):
+            if i in extracted:
+                text = extracted[i][0]
+            elif i + 1 in cached:
+                text = self.content.text(cached[i + 1])
+            else:
+                text = ""  # Unchanged page that was empty before
+            if text.strip():
+                pages.append({'page': i + 1, 'text': text})
+        
+        self.content = PageStore.from_pages(pages)
+        self.page_hashes = new_hashes
+        # Re-indexing works on already-extracted text, so it is cheap next to extraction
+        self.build_index()
+        self.save_cache()
+    
+    def _extract_pages(self, indices: List[int]) -> Dict[int, Tuple[str, bytes]]:
+        """Extract {index: (text, digest)} for pages, splitting the work across a process pool"""
+        total_pages = len(indices)
+        workers = min(os.cpu_count() or 1, total_pages // MIN_PAGES_PER_WORKER)
+        if workers <= 1:
+            return {i: (text, digest) for i, text, digest in _extract_page_list(str(self.pdf_path), indices)}
+        
+        # Several chunks per worker keeps the pool busy and progress reports regular
+        chunk_size = max(MIN_PAGES_PER_WORKER // 2, total_pages // (workers * 4))
+        chunks = [indices[start:start + chunk_size] for start in range(0, total_pages, chunk_size)]
+        
+        extracted = {}
+        done = 0
+        next_report = 50
+        print(f"  Using {workers} worker processes...")
+        # Spawn rather than fork: we are usually called from a background thread of the GUI
+        mp_context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=mp_context) as pool:
+            futures = [pool.submit(_extract_page_list, str(self.pdf_path), chunk) for chunk in chunks]
+            for future in as_completed(futures):
+                # Callers merge by page index, so completion order doesn't matter
+                pages = future.result()
+                for i, text, digest in pages:
+                    extracted[i] = (text, digest)
+                done += len(pages)
+                if done >= next_report or done == total_pages:
+                    print(f"  Processed {done}/{total_pages} pages...")
+                    next_report = done - done % 50 + 50
+        
+        return extracted
+    
+    def build_index(self):
+        """Build the BM25 inverted indexes over the loaded pages and their passages"""
+        self.query_cache.clear()
+        self.index = InvertedIndex.build(page_data['text'] for page_data in self.content)
+        
+        self.passage_pages = array('I')
+        self.passage_starts = array('I')
+        self.passage_ends = array('I')
+        self.passage_index = InvertedIndex()
+        for page_idx, page_data in enumerate(self.content):
+            text = page_data['text']
+            for start, end in split_passages(text, PASSAGE_SIZE, PASSAGE_STRIDE):
+                self.passage_pages.append(page_idx)
+                self.passage_starts.append(start)
+                self.passage_ends.append(end)
+                self.passage_index.add(text[start:end])
+        self.passage_index.freeze()
+        self.trigram_index = TrigramIndex.build(self.index.terms)
+        self.command_index = CommandIndex.build(page_data['text'] for page_data in self.content)
+    
+    def correct_query(self, query: str) -> str:
+        """Replace normalized query terms missing from the index with their closest indexed terms"""
+        corrected = set()
+        for word in query.split():
+            matches = [] if self.index.doc_freq(word) else self.trigram_index.similar(word)
+            if matches:
+                # Closest spelling first, then the more common term
+                word = min(matches, key=lambda m: (m[1], -self.index.doc_freq(m[0])))[0]
+            corrected.add(word)
+        return " ".join(sorted(corrected))
+    
+    def _ranked(self, index: InvertedIndex, query: str, max_results: int, hits=None):
+        """Exact-term hits, topped up from the spelling-corrected query when there are too few"""
+        if hits is None:
+            hits = index.search(query, max_results)
+        if len(hits) < min(FUZZY_MIN_HITS, max_results):
+            corrected = self.correct_query(query)
+            if corrected != query:
+                seen = {doc_id for doc_id, _ in hits}
+                hits = hits + [hit for hit in index.search(corrected, max_results) if hit[0] not in seen]
+        return hits[:max_results]
     
     def search(self, query: str, max_results: int = 5) -> List[Dict]:
-        """Search for relevant content in the PDF"""
-        query_lower = query.lower()
+        """Search for relevant content in the PDF (cached results are shared, treat as read-only)"""
+        query = normalize_query(query)
+        key = ('pages', query, max_results)
+        cached = self.query_cache.get(key)
+        if cached is not None:
+            return cached
+        
         results = []
+        # Only the postings of the query terms are touched
+        for doc_id, score in self._ranked(self.index, query, max_results):
+            results.append({
+                'page': self.content.page_number(doc_id),
+                'text': self.content.text(doc_id),
+                'score': score
+            })
         
-        for page_data in self.content:
-            text = page_data['text']
-            text_lower = text.lower()
-            
-            # Simple relevance scoring
-            score = 0
-            for word in query_lower.split():
-                if len(word) > 2:  # Skip very short words
-                    score += text_lower.count(word)
-            
-            if score > 0:
-                results.append({
-                    'page': page_data['page'],
-                    'text': text,
+        self.query_cache.put(key, results)
+        return results
+    
+    def search_many(self, queries: List[str], max_results: int = 5) -> List[List[Dict]]:
+        """Search a batch of queries at once; results line up with `queries`"""
+        normalized = [normalize_query(q) for q in queries]
+        results: List[Optional[List[Dict]]] = [
+            self.query_cache.get(('pages', q, max_results)) for q in normalized
+        ]
+        
+        # Score every cache miss with one batched matrix product
+        misses = sorted({q for q, r in zip(normalized, results) if r is None})
+        scored = {
+            query: self._ranked(self.index, query, max_results, hits)
+            for query, hits in zip(misses, self.index.search_many(misses, max_results))
+        }
+        
+        built: Dict[str, List[Dict]] = {}
+        for i, query in enumerate(normalized):
+            if results[i] is not None:
+                continue
+            if query not in built:
+                built[query] = [{
+                    'page': self.content.page_number(doc_id),
+                    'text': self.content.text(doc_id),
                     'score': score
-                })
+                } for doc_id, score in scored[query]]
+                self.query_cache.put(('pages', query, max_results), built[query])
+            results[i] = built[query]
         
-        # Sort by score and return top results
-        results.sort(key=lambda x: x['score'], reverse=True)
-        return results[:max_results]
+        return results
     
-    def get_context(self, query: str) -> str:
-        """Get relevant context for a query"""
-        results = self.search(query, max_results=2)  # Reduced from 3 to 2
+    def search_passages(self, query: str, max_results: int = 5) -> List[Dict]:
+        """Search for the best matching passages, with page and character offsets"""
+        query = normalize_query(query)
+        key = ('passages', query, max_results)
+        cached = self.query_cache.get(key)
+        if cached is not None:
+            return cached
         
-        if not results:
-            return ""  # Return empty instead of message to save tokens
+        results = []
+        
+        for doc_id, score in self._ranked(self.passage_index, query, max_results):
+            page_idx = self.passage_pages[doc_id]
+            start, end = self.passage_starts[doc_id], self.passage_ends[doc_id]
+            results.append({
+                'page': self.content.page_number(page_idx),
+                'start': start,
+                'end': end,
+                'text': self.content.text(page_idx)[start:end],
+                'score': score
+            })
+        
+        self.query_cache.put(key, results)
+        return results
+    
+    def lookup_command(self, name: str, max_results: int = 2) -> List[Dict]:
+        """Reference sections for a command name, best documented page first"""
+        results = []
+        for page_idx, offset, count in self.command_index.lookup(name)[:max_results]:
+            text = self.content.text(page_idx)
+            # Start at the line before the first example, which usually introduces it
+            start = text.rfind('\n', 0, max(text.rfind('\n', 0, offset), 0)) + 1
+            end = min(start + COMMAND_SNIPPET_SIZE, len(text))
+            results.append({
+                'page': self.content.page_number(page_idx),
+                'start': start,
+                'end': end,
+                'text': text[start:end],
+                'count': count
+            })
+        return results
+    
+    def get_command_context(self, command: str, token_budget: int = DEFAULT_CONTEXT_TOKENS) -> str:
+        """Get the reference section for the program a shell command runs"""
+        results = self.lookup_command(command_name(command), max_results=1)
+        return pack_context([{**r, 'title': self.title, 'score': r['count']} for r in results], token_budget)
+    
+    def get_context(self, query: str, token_budget: int = DEFAULT_CONTEXT_TOKENS) -> str:
+        """Get relevant context for a query, packed into `token_budget` estimated tokens"""
+        key = ('context', normalize_query(query), token_budget)
+        cached = self.query_cache.get(key)
+        if cached is not None:
+            return cached
         
-        context = "Reference from Ubuntu Linux Toolbox:\n\n"
-        for i, result in enumerate(results, 1):
-            # Limit text length to 400 chars per page (reduced from 1000)
-            text = result['text'][:400]
-            context += f"{text}\n\n"
+        # Over-fetch so overlapping and duplicate windows can be skipped
+        candidates = self.search_passages(query, max_results=token_budget // 50 + 2)
+        # Stays empty when nothing matches, to save tokens
+        context = pack_context([{**c, 'title': self.title} for c in candidates], token_budget)
         
+        self.query_cache.put(key, context)
         return context
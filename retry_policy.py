@@ -0,0 +1,97 @@
+"""
+Retry Policy - Classifies command failures and decides whether to retry, back off, ask the LLM or stop
+"""
+import re
+from typing import Dict, List, Optional
+
+# Failure classes
+TRANSIENT = "transient"          # Locks, network hiccups: the same command may work shortly
+DETERMINISTIC = "deterministic"  # Typos, missing files/packages, bad options: rerunning can't help
+PERMISSION = "permission"        # Needs root or a password
+UNKNOWN = "unknown"
+
+# Decisions
+RETRY = "retry"        # Run the same command again now
+BACKOFF = "backoff"    # Run the same command again after a delay
+ASK_LLM = "ask_llm"    # Get a different command (fix cache or LLM)
+STOP = "stop"          # Give up on this command
+
+CLASS_PATTERNS = [
+    (PERMISSION, re.compile(
+        r"permission denied|operation not permitted|are you root|must be run as root|"
+        r"a password is required|a terminal is required|not in the sudoers", re.I)),
+    (TRANSIENT, re.compile(
+        r"could not get lock|unable to acquire the dpkg|is another process using it|resource temporarily unavailable|"
+        r"temporary failure|could not resolve|connection (timed out|refused|reset)|network is unreachable|"
+        r"try again|\b50[234]\b|hash sum mismatch", re.I)),
+    (DETERMINISTIC, re.compile(
+        r"command not found|no such file or directory|unable to locate package|has no installation candidate|"
+        r"syntax error|invalid option|unrecognized option|unknown option|invalid operation|usage:|not found|"
+        r"is not a directory|is a directory|no such (device|process)|invalid argument", re.I)),
+]
+
+# Password prompts and missing sudo rights can't be fixed without the user
+HOPELESS_PERMISSION_RE = re.compile(r"a password is required|a terminal is required|not in the sudoers", re.I)
+
+TRANSIENT_RETRIES = 3      # Back-offs before a transient failure is treated like any other
+BACKOFF_BASE = 1.0         # Seconds; doubled on each back-off
+BACKOFF_MAX = 8.0
+
+
+def classify(stderr: str) -> str:
+    """Failure class of a command from its error output"""
+    for failure_class, pattern in CLASS_PATTERNS:
+        if pattern.search(stderr):
+            return failure_class
+    return UNKNOWN
+
+
+class RetryPolicy:
+    """
+    Per-failure decisions for the retry loop in CommandExecutor.
+
+    decide() looks at the error and at the earlier failed attempts of the same
+    command; check_fix() vetoes fixes that would only rerun a command that
+    already failed the same way, so hopeless loops stop early instead of
+    burning LLM calls and command timeouts until max_attempts.
+    """
+
+    def __init__(self, transient_retries: int = TRANSIENT_RETRIES,
+                 backoff_base: float = BACKOFF_BASE, backoff_max: float = BACKOFF_MAX):
+        self.transient_retries = transient_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+    def decide(self, command: str, stderr: str, history: List[Dict]) -> Dict:
+        """Decision for a failed attempt; history holds the earlier failed attempts of this command"""
+        failure_class = classify(stderr)
+        decision = {"class": failure_class, "action": ASK_LLM, "delay": 0.0, "reason": ""}
+
+        if failure_class == TRANSIENT:
+            backoffs = sum(1 for a in history if a.get("decision", {}).get("action") == BACKOFF)
+            if backoffs < self.transient_retries:
+                decision["action"] = BACKOFF
+                decision["delay"] = min(self.backoff_base * 2 ** backoffs, self.backoff_max)
+                decision["reason"] = "transient error, retrying the same command"
+        elif failure_class == PERMISSION and command.lstrip().startswith("sudo") and HOPELESS_PERMISSION_RE.search(stderr):
+            decision["action"] = STOP
+            decision["reason"] = "sudo needs a password or rights that can't be given here"
+        elif "timed out after" in stderr and any(a["command"] == command for a in history):
+            decision["action"] = STOP
+            decision["reason"] = "command timed out twice"
+        return decision
+
+    def check_fix(self, decision: Dict, fix: Optional[str], command: str, stderr: str, history: List[Dict]) -> Dict:
+        """Apply the no-identical-rerun rule to the fix found for an ASK_LLM decision"""
+        tried = {(a["command"], a["stderr"]) for a in history}
+        if fix is None or fix == command:
+            if decision["class"] in (DETERMINISTIC, PERMISSION):
+                return {**decision, "action": STOP, "reason": f"{decision['class']} error and no different command to try"}
+            if (command, stderr) in tried:
+                return {**decision, "action": STOP, "reason": "same command failed the same way before"}
+            return {**decision, "action": RETRY, "reason": "no alternative command, retrying once"}
+        if any(a["command"] == fix for a in history):
+            failed_before = [a for a in history if a["command"] == fix]
+            if decision["class"] != TRANSIENT or len(failed_before) > 1:
+                return {**decision, "action": STOP, "reason": f"suggested fix already failed: {fix}"}
+        return decision
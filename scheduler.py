@@ -0,0 +1,188 @@
+"""
+Command Scheduler - Runs independent read-only commands concurrently while mutating commands keep their order
+"""
+import re
+import shlex
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Callable, Dict, List, Optional
+
+MAX_PARALLEL = 4
+
+# Programs that only read system state, whatever their arguments
+READ_ONLY_PROGRAMS = frozenset("""
+    df du free uptime uname whoami id who w groups ps lsblk lsof lscpu lsusb lspci lsb_release nproc
+    cal which whereis type cat head tail wc grep egrep fgrep sort uniq cut tr column awk ls stat file
+    echo printf pwd printenv diff cmp md5sum sha256sum ping dig nslookup host traceroute tracepath
+    netstat ss journalctl dmesg vmstat iostat lsmod last true test sed find date hostname ifconfig ip
+""".split())
+
+# Programs that are read-only only with one of these subcommands
+READ_ONLY_SUBCOMMANDS = {
+    'systemctl': {'status', 'is-active', 'is-enabled', 'is-failed', 'list-units', 'list-unit-files',
+                  'list-timers', 'show', 'cat'},
+    'apt': {'list', 'show', 'search', 'policy'},
+    'apt-cache': {'show', 'search', 'policy', 'depends', 'rdepends', 'showpkg', 'madison'},
+    'dpkg': {'-l', '-L', '-s', '-S', '--list', '--listfiles', '--status', '--search', '--get-selections'},
+    'snap': {'list', 'info', 'find', 'version'},
+    'git': {'status', 'log', 'diff', 'show'},
+    'docker': {'ps', 'images', 'inspect', 'logs', 'version', 'info'},
+}
+
+# Arguments that turn an otherwise read-only program into a mutating one
+MUTATING_ARGS = {
+    'find': re.compile(r"-(delete|exec|execdir|ok|okdir|fprint0?|fprintf|fls)$"),
+    'sed': re.compile(r"-[A-Za-z]*i|--in-place"),  # Also combined flags: -Ei, -ni
+    'sort': re.compile(r"-[A-Za-z]*o|--output"),
+    'date': re.compile(r"-s|--set"),
+    'journalctl': re.compile(r"--(vacuum|rotate|flush|sync|relinquish-var|setup-keys)"),
+    'dmesg': re.compile(r"-[A-Za-z]*[cCDEn]$|--(clear|read-clear|console-)"),
+    # Program text that runs commands or writes files; comparisons with > are caught too (safe side)
+    'awk': re.compile(r".*(system\s*\(|>|\||getline)", re.S),
+    'ip': re.compile(r"(add|del|delete|set|flush|change|replace|append)$"),
+    'hostname': re.compile(r"[^-]"),  # "hostname NAME" sets the name
+    'ifconfig': re.compile(r"[^-]"),  # "ifconfig eth0 up" reconfigures
+}
+
+# Programs whose operand after the last input is an output file ("uniq IN OUT")
+MAX_INPUT_OPERANDS = {'uniq': 1}
+
+OPERATORS = {';', '&&', '||', '|', '&', '\n'}
+REDIRECTS = {'>', '>>', '>|', '&>', '&>>'}
+
+
+def _segments(command: str) -> Optional[List[List[str]]]:
+    """Split a command line into simple commands, or None if it uses syntax we don't classify"""
+    lexer = shlex.shlex(command, posix=True, punctuation_chars=True)
+    lexer.whitespace_split = True
+    try:
+        tokens = list(lexer)
+    except ValueError:  # Unbalanced quotes
+        return None
+
+    segments = [[]]
+    previous = None
+    for token in tokens:
+        if token in OPERATORS:
+            segments.append([])
+        elif token in ('(', ')') or '`' in token or '$(' in token:
+            return None  # Subshells and command substitution
+        elif previous in REDIRECTS:
+            if token != '/dev/null':
+                return None  # Writes a file
+        elif token in REDIRECTS or token in ('<', '>&', '<&'):
+            if segments[-1] and segments[-1][-1].isdigit():
+                segments[-1].pop()  # File descriptor number, as in 2>/dev/null
+        elif previous not in ('>&', '<&'):  # Skip the target descriptor of 2>&1
+            segments[-1].append(token)
+        previous = token
+    return [segment for segment in segments if segment]
+
+
+def _is_read_only_segment(words: List[str]) -> bool:
+    # Wrappers run the program after them: classify that program
+    while True:
+        while words and re.match(r"[A-Za-z_][A-Za-z0-9_]*=", words[0]):
+            words = words[1:]  # VAR=value prefixes
+        if words and words[0] == 'sudo':
+            words = words[1:]
+            while words and words[0].startswith('-'):
+                words = words[2:] if words[0] in ('-u', '-g') else words[1:]
+        elif words and words[0] == 'env':
+            words = words[1:]
+            while words and words[0].startswith('-'):
+                if words[0] in ('-S', '--split-string') or words[0].startswith(('-S', '--split-string=')):
+                    return False  # The command is inside a string we don't parse
+                words = words[2:] if words[0] in ('-u', '-C', '--unset', '--chdir') else words[1:]
+        else:
+            break
+    if not words:
+        return True  # Bare "env" or "sudo" with only options prints or checks something
+
+    program, args = words[0], words[1:]
+    if program in READ_ONLY_SUBCOMMANDS:
+        return bool(args) and args[0] in READ_ONLY_SUBCOMMANDS[program]
+    if program not in READ_ONLY_PROGRAMS:
+        return False
+    if program in MAX_INPUT_OPERANDS:
+        # Option values ("-f 2") count as operands too: errs on the mutating side
+        if sum(1 for arg in args if not arg.startswith('-')) > MAX_INPUT_OPERANDS[program]:
+            return False
+    pattern = MUTATING_ARGS.get(program)
+    return pattern is None or not any(pattern.match(arg) for arg in args)
+
+
+def is_read_only(command: str) -> bool:
+    """True if every part of the command only reads system state (conservative: unknown means mutating)"""
+    segments = _segments(command)
+    return bool(segments) and all(_is_read_only_segment(words) for words in segments)
+
+
+class CommandScheduler:
+    """
+    Runs commands as they are submitted, honouring a small dependency graph:
+    a mutating command waits for every command before it, and a read-only
+    command waits only for the last mutating command before it. So
+    "df -h", "free -h", "uptime" run side by side, while "apt update" and
+    "apt install" stay in order.
+
+    run(cmd_idx, command, step) executes one command with its retries and
+    records into `step` ({"attempts": [], "summary": ""}); once a command
+    fails, commands that have not started yet are skipped. finish() merges
+    the steps into the report in command order, so the report does not
+    depend on which command finished first.
+    """
+
+    def __init__(self, run: Callable[[int, str, Dict], bool], max_workers: int = MAX_PARALLEL):
+        self.run = run
+        self.commands: List[str] = []
+        self.steps: List[Dict] = []
+        self.futures: List[Future] = []
+        self.failed = threading.Event()
+        self._barrier: Optional[Future] = None  # Last mutating command
+        self._since_barrier: List[Future] = []
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="command")
+
+    def submit(self, command: str) -> int:
+        """Queue a command; returns its 1-based index"""
+        cmd_idx = len(self.commands) + 1
+        step = {"attempts": [], "summary": ""}
+        read_only = is_read_only(command)
+        if read_only:
+            deps = [self._barrier] if self._barrier else []
+        else:
+            deps = ([self._barrier] if self._barrier else []) + self._since_barrier
+
+        # Dependencies were submitted earlier, so they leave the FIFO queue first: no deadlock
+        future = self._pool.submit(self._run_after, deps, cmd_idx, command, step)
+        if read_only:
+            self._since_barrier.append(future)
+        else:
+            self._barrier = future
+            self._since_barrier = []
+        self.commands.append(command)
+        self.steps.append(step)
+        self.futures.append(future)
+        return cmd_idx
+
+    def _run_after(self, deps: List[Future], cmd_idx: int, command: str, step: Dict) -> Optional[bool]:
+        wait(deps)
+        if self.failed.is_set():
+            return None  # An earlier command failed for good
+        if not self.run(cmd_idx, command, step):
+            self.failed.set()
+            return False
+        return True
+
+    def finish(self, report: Dict) -> bool:
+        """Wait for every command, merge their attempts into the report in order; True if all succeeded"""
+        results = [future.result() for future in self.futures]
+        self._pool.shutdown()
+        for step in self.steps:
+            report["attempts"].extend(step["attempts"])
+        for step, result in zip(self.steps, results):
+            if result is False:
+                report["final_status"] = "failed"
+                report["summary"] = step["summary"]
+                break
+        return all(results)
@@ -0,0 +1,502 @@
+"""
+Search Index - Tokenization and BM25-ranked inverted index used by the knowledge base
+"""
+import math
+import re
+import heapq
+import threading
+from array import array
+from collections import OrderedDict
+from bisect import bisect_left
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Sequence, Tuple, Union
+
+try:
+    import numpy as np
+except ImportError:  # Optional: batched scoring falls back to per-query postings walks
+    np = None
+
+# Keep shell-ish tokens such as "apt-get", "python3" or "g++" intact
+TOKEN_RE = re.compile(r"[a-z0-9][a-z0-9_+.\-]*[a-z0-9+]|[a-z0-9]")
+MIN_TOKEN_LEN = 2
+
+# Words that carry no retrieval signal in requests like "how do I check the disk space"
+STOP_WORDS = frozenset("""
+    a an and are as at be by can do does for from how i in is it me my of on or
+    please show so that the this to up use using want what when where which why
+    will with you your
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    """Split text into lowercase search tokens"""
+    return [t for t in TOKEN_RE.findall(text.lower()) if len(t) >= MIN_TOKEN_LEN]
+
+
+def normalize_query(query: str) -> str:
+    """Canonical form of a query: lowercased tokens, stop words removed, deduplicated and sorted"""
+    return " ".join(sorted(set(tokenize(query)) - STOP_WORDS))
+
+
+class QueryCache:
+    """Thread-safe bounded LRU cache for query results, with hit/miss counters"""
+
+    def __init__(self, maxsize: int = 256):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key: Hashable, value: Any):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """Drop all entries (counters are kept)"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Union[int, float]]:
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
+
+
+def split_passages(text: str, size: int = 400, stride: int = 200) -> List[Tuple[int, int]]:
+    """Split text into overlapping (start, end) character windows snapped to whitespace"""
+    spans = []
+    length = len(text)
+    start = 0
+
+    while start < length:
+        end = min(start + size, length)
+        if end < length:
+            # Don't cut a word in half at the end of the window
+            space = text.rfind(' ', start + size // 2, end)
+            if space != -1:
+                end = space
+        spans.append((start, end))
+        if end >= length:
+            break
+
+        next_start = start + stride
+        space = text.find(' ', next_start, end)
+        start = space + 1 if space != -1 else next_start
+
+    return spans
+
+
+class InvertedIndex:
+    """Inverted index with term frequencies and document lengths, scored with BM25
+
+    Documents are added to dict-of-list postings; freeze() packs them into flat
+    integer arrays (one slice per term), which is also the form stored in and
+    memory-mapped from the knowledge base cache.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, List[Tuple[int, int]]] = {}
+        self.doc_lengths: Sequence[int] = array('I')
+        self.total_length = 0
+        # Frozen form: term -> slice [term_offsets[i], term_offsets[i + 1]) of doc_ids/tfs
+        self.vocab: Optional[Dict[str, int]] = None
+        self.terms: List[str] = []  # Term ids back to terms (sorted)
+        self.term_offsets: Sequence[int] = array('I')
+        self.doc_ids: Sequence[int] = array('I')
+        self.tfs: Sequence[int] = array('I')
+        self._term_matrix: Optional["TermMatrix"] = None  # Built lazily by search_many
+
+    @classmethod
+    def build(cls, texts: Iterable[str], **kwargs) -> "InvertedIndex":
+        """Build an index where document ids are positions in `texts`"""
+        index = cls(**kwargs)
+        for text in texts:
+            index.add(text)
+        index.freeze()
+        return index
+
+    def __len__(self) -> int:
+        return len(self.doc_lengths)
+
+    @property
+    def frozen(self) -> bool:
+        return self.vocab is not None
+
+    def add(self, text: str) -> int:
+        """Index a document and return its id"""
+        if self.frozen:
+            raise RuntimeError("cannot add documents to a frozen index")
+
+        doc_id = len(self.doc_lengths)
+        tokens = tokenize(text)
+
+        counts: Dict[str, int] = {}
+        for token in tokens:
+            counts[token] = counts.get(token, 0) + 1
+        for term, tf in counts.items():
+            self.postings.setdefault(term, []).append((doc_id, tf))
+
+        self.doc_lengths.append(len(tokens))
+        self.total_length += len(tokens)
+        return doc_id
+
+    def freeze(self):
+        """Pack the postings into flat arrays; the index becomes read-only"""
+        if self.frozen:
+            return
+        self.vocab = {}
+        self.terms = sorted(self.postings)
+        self.term_offsets = array('I', [0])
+        for term in self.terms:
+            self.vocab[term] = len(self.vocab)
+            for doc_id, tf in self.postings[term]:
+                self.doc_ids.append(doc_id)
+                self.tfs.append(tf)
+            self.term_offsets.append(len(self.doc_ids))
+        self.postings = {}
+
+    def to_sections(self, prefix: str) -> Dict[str, Union[array, bytes]]:
+        """Serializable arrays for kb_cache.write_cache"""
+        self.freeze()
+        return {
+            prefix + 'vocab': "\n".join(self.vocab).encode('utf-8'),
+            prefix + 'term_offsets': array('I', self.term_offsets),
+            prefix + 'doc_ids': array('I', self.doc_ids),
+            prefix + 'tfs': array('I', self.tfs),
+            prefix + 'doc_lengths': array('I', self.doc_lengths),
+        }
+
+    @classmethod
+    def from_sections(cls, sections: Dict[str, memoryview], prefix: str, **kwargs) -> "InvertedIndex":
+        """Load a frozen index from (memory-mapped) sections written by to_sections"""
+        index = cls(**kwargs)
+        vocab = bytes(sections[prefix + 'vocab']).decode('utf-8')
+        index.terms = vocab.split("\n") if vocab else []
+        index.vocab = {term: i for i, term in enumerate(index.terms)}
+        index.term_offsets = sections[prefix + 'term_offsets']
+        index.doc_ids = sections[prefix + 'doc_ids']
+        index.tfs = sections[prefix + 'tfs']
+        index.doc_lengths = sections[prefix + 'doc_lengths']
+        index.total_length = sum(index.doc_lengths)
+        return index
+
+    def get_postings(self, term: str) -> Iterable[Tuple[int, int]]:
+        """(doc_id, tf) pairs for a term"""
+        if not self.frozen:
+            return self.postings.get(term, ())
+        i = self.vocab.get(term)
+        if i is None:
+            return ()
+        start, end = self.term_offsets[i], self.term_offsets[i + 1]
+        return zip(self.doc_ids[start:end], self.tfs[start:end])
+
+    def doc_freq(self, term: str) -> int:
+        if not self.frozen:
+            return len(self.postings.get(term, ()))
+        i = self.vocab.get(term)
+        return 0 if i is None else self.term_offsets[i + 1] - self.term_offsets[i]
+
+    @property
+    def avg_doc_length(self) -> float:
+        return self.total_length / len(self.doc_lengths) if self.doc_lengths else 0.0
+
+    def idf(self, term: str) -> float:
+        """BM25 inverse document frequency (always positive)"""
+        df = self.doc_freq(term)
+        n = len(self.doc_lengths)
+        return math.log(1 + (n - df + 0.5) / (df + 0.5))
+
+    def search(self, query: str, max_results: int = 5) -> List[Tuple[int, float]]:
+        """Return (doc_id, score) pairs for the best matching documents"""
+        if not self.doc_lengths:
+            return []
+
+        k1, b = self.k1, self.b
+        avgdl = self.avg_doc_length or 1.0
+        doc_lengths = self.doc_lengths
+        scores: Dict[int, float] = {}
+
+        for term in set(tokenize(query)):
+            if not self.doc_freq(term):
+                continue
+            idf = self.idf(term)
+            for doc_id, tf in self.get_postings(term):
+                norm = k1 * (1 - b + b * doc_lengths[doc_id] / avgdl)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (k1 + 1) / (tf + norm)
+
+        return heapq.nlargest(max_results, scores.items(), key=lambda item: item[1])
+
+    def search_many(self, queries: Sequence[str], max_results: int = 5) -> List[List[Tuple[int, float]]]:
+        """Score a batch of queries; one sparse product when NumPy is available"""
+        if np is None or not self.doc_lengths:
+            return [self.search(query, max_results) for query in queries]
+        return TermMatrix.for_index(self).search_many(queries, max_results)
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """Optimal string alignment distance (adjacent transpositions count as one), capped at limit + 1"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    prev2 = None
+    prev = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        cur = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + cost)
+            if prev2 is not None and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                cur[j] = min(cur[j], prev2[j - 2] + 1)
+        if min(cur) > limit:
+            return limit + 1
+        prev2, prev = prev, cur
+    return prev[-1]
+
+
+class TrigramIndex:
+    """
+    Character-trigram index over a term list, for typo-tolerant lookups.
+
+    Terms are padded with spaces and each trigram is packed into an integer
+    (TRIGRAM_BASE ** 3 possible codes). Only codes that occur are stored, so
+    the index is three flat arrays: the sorted codes, and for the code at
+    position i, offsets[i]..offsets[i + 1] slices term ids out of term_ids.
+    """
+
+    ALPHABET = " abcdefghijklmnopqrstuvwxyz0123456789_+.-"
+    TRIGRAM_BASE = 64
+    MAX_CANDIDATES = 40  # Terms sharing the most trigrams that get an edit-distance check
+
+    _CODES = {c: i + 1 for i, c in enumerate(ALPHABET)}
+
+    def __init__(self, terms: Sequence[str] = (), codes: Sequence[int] = (), offsets: Sequence[int] = (0,),
+                 term_ids: Sequence[int] = ()):
+        self.terms = terms
+        self.codes = codes
+        self.offsets = offsets
+        self.term_ids = term_ids
+
+    @classmethod
+    def trigrams(cls, term: str) -> List[int]:
+        codes = cls._CODES
+        base = cls.TRIGRAM_BASE
+        padded = [codes.get(c, 0) for c in f" {term} "]
+        return sorted({(padded[i] * base + padded[i + 1]) * base + padded[i + 2]
+                       for i in range(len(padded) - 2)})
+
+    @classmethod
+    def build(cls, terms: Sequence[str]) -> "TrigramIndex":
+        buckets: Dict[int, List[int]] = {}
+        for term_id, term in enumerate(terms):
+            for gram in cls.trigrams(term):
+                buckets.setdefault(gram, []).append(term_id)
+
+        codes = array('I', sorted(buckets))
+        offsets = array('I', [0])
+        term_ids = array('I')
+        for gram in codes:
+            term_ids.extend(buckets[gram])
+            offsets.append(len(term_ids))
+        return cls(terms, codes, offsets, term_ids)
+
+    def to_sections(self, prefix: str) -> Dict[str, array]:
+        return {
+            prefix + 'codes': array('I', self.codes),
+            prefix + 'offsets': array('I', self.offsets),
+            prefix + 'term_ids': array('I', self.term_ids),
+        }
+
+    @classmethod
+    def from_sections(cls, sections: Dict[str, memoryview], prefix: str, terms: Sequence[str]) -> "TrigramIndex":
+        return cls(terms, sections[prefix + 'codes'], sections[prefix + 'offsets'], sections[prefix + 'term_ids'])
+
+    def similar(self, word: str, max_results: int = 3) -> List[Tuple[str, int]]:
+        """Indexed terms within a length-scaled edit distance of `word`, closest first"""
+        if not self.terms:
+            return []
+        grams = self.trigrams(word)
+        shared: Dict[int, int] = {}
+        codes, offsets, term_ids = self.codes, self.offsets, self.term_ids
+        for gram in grams:
+            i = bisect_left(codes, gram)
+            if i == len(codes) or codes[i] != gram:
+                continue
+            for term_id in term_ids[offsets[i]:offsets[i + 1]]:
+                shared[term_id] = shared.get(term_id, 0) + 1
+
+        limit = 1 if len(word) <= 5 else 2
+        candidates = heapq.nlargest(self.MAX_CANDIDATES, shared.items(), key=lambda item: item[1])
+        matches = []
+        for term_id, _ in candidates:
+            term = self.terms[term_id]
+            distance = edit_distance(word, term, limit)
+            if distance <= limit:
+                matches.append((term, distance))
+        matches.sort(key=lambda item: item[1])
+        return matches[:max_results]
+
+
+class CommandIndex:
+    """
+    Maps command names to the pages that document them.
+
+    The book shows commands as shell transcripts ("$ apt-get install ...",
+    "# dpkg -l"), so every prompt line is an invocation of its command. For
+    each command the pages with the most invocations are kept, with the
+    character offset of the first one, as flat arrays: entries for command i
+    are [offsets[i], offsets[i + 1]) of pages/starts/counts.
+    """
+
+    PROMPT_RE = re.compile(r"^[ \t]*[$#][ \t]+(?:sudo[ \t]+)?([a-z][a-z0-9_+.\-]*)", re.MULTILINE)
+    MAX_PAGES_PER_COMMAND = 5
+
+    def __init__(self, names: Sequence[str], offsets: Sequence[int], pages: Sequence[int],
+                 starts: Sequence[int], counts: Sequence[int]):
+        self.names = {name: i for i, name in enumerate(names)}
+        self.offsets = offsets
+        self.pages = pages
+        self.starts = starts
+        self.counts = counts
+
+    @classmethod
+    def build(cls, texts: Iterable[str]) -> "CommandIndex":
+        """Build from page texts; page ids are positions in `texts`"""
+        found: Dict[str, Dict[int, List[int]]] = {}  # name -> page -> [first offset, count]
+        for page_id, text in enumerate(texts):
+            for match in cls.PROMPT_RE.finditer(text):
+                name = match.group(1).rstrip('.')
+                if len(name) < 2:
+                    continue
+                entry = found.setdefault(name, {}).setdefault(page_id, [match.start(1), 0])
+                entry[1] += 1
+
+        names = sorted(found)
+        offsets, pages, starts, counts = array('I', [0]), array('I'), array('I'), array('I')
+        for name in names:
+            # Most invocations first; earlier pages win ties since they usually introduce the command
+            ranked = sorted(found[name].items(), key=lambda item: (-item[1][1], item[0]))
+            for page_id, (start, count) in ranked[:cls.MAX_PAGES_PER_COMMAND]:
+                pages.append(page_id)
+                starts.append(start)
+                counts.append(count)
+            offsets.append(len(pages))
+        return cls(names, offsets, pages, starts, counts)
+
+    def to_sections(self, prefix: str) -> Dict[str, Union[array, bytes]]:
+        return {
+            prefix + 'names': "\n".join(self.names).encode('utf-8'),
+            prefix + 'offsets': array('I', self.offsets),
+            prefix + 'pages': array('I', self.pages),
+            prefix + 'starts': array('I', self.starts),
+            prefix + 'counts': array('I', self.counts),
+        }
+
+    @classmethod
+    def from_sections(cls, sections: Dict[str, memoryview], prefix: str) -> "CommandIndex":
+        names = bytes(sections[prefix + 'names']).decode('utf-8')
+        return cls(names.split("\n") if names else [], sections[prefix + 'offsets'],
+                   sections[prefix + 'pages'], sections[prefix + 'starts'], sections[prefix + 'counts'])
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.names
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def lookup(self, name: str) -> List[Tuple[int, int, int]]:
+        """(page_id, first offset, invocation count) for the pages documenting a command"""
+        i = self.names.get(name)
+        if i is None:
+            return []
+        return [(self.pages[j], self.starts[j], self.counts[j])
+                for j in range(self.offsets[i], self.offsets[i + 1])]
+
+
+class TermMatrix:
+    """
+    BM25-weighted term-document matrix in CSR layout (rows = terms, columns = docs).
+
+    The frozen index postings already are CSR arrays (term_offsets = indptr,
+    doc_ids = indices); only the data array of per-posting BM25 weights is
+    computed here. A batch of queries is a binary query-term matrix Q, and
+    scores = Q @ W is evaluated with one bincount over the gathered postings.
+    """
+
+    # Upper bound on dense query x doc score cells materialized per chunk
+    MAX_CELLS = 4_000_000
+
+    def __init__(self, index: InvertedIndex):
+        index.freeze()
+        self.vocab = index.vocab
+        self.n_docs = len(index)
+        self.indptr = np.frombuffer(index.term_offsets, dtype=np.uint32).astype(np.int64)
+        self.indices = np.frombuffer(index.doc_ids, dtype=np.uint32).astype(np.int64)
+
+        tfs = np.frombuffer(index.tfs, dtype=np.uint32).astype(np.float64)
+        doc_lengths = np.frombuffer(index.doc_lengths, dtype=np.uint32).astype(np.float64)
+        df = np.diff(self.indptr)
+        idf = np.log1p((self.n_docs - df + 0.5) / (df + 0.5))
+        norm = index.k1 * (1 - index.b + index.b * doc_lengths[self.indices] / (index.avg_doc_length or 1.0))
+        self.data = np.repeat(idf, df) * tfs * (index.k1 + 1) / (tfs + norm)
+
+    @classmethod
+    def for_index(cls, index: InvertedIndex) -> "TermMatrix":
+        """Matrix for an index, built on first use and kept on the index"""
+        if index._term_matrix is None:
+            index._term_matrix = cls(index)
+        return index._term_matrix
+
+    def query_terms(self, query: str) -> List[int]:
+        return [self.vocab[t] for t in set(tokenize(query)) if t in self.vocab]
+
+    def scores(self, term_ids: Sequence[Sequence[int]]) -> "np.ndarray":
+        """Dense (len(term_ids) x n_docs) score matrix for query term-id lists"""
+        positions = []
+        rows = []
+        for row, ids in enumerate(term_ids):
+            for t in ids:
+                start, end = self.indptr[t], self.indptr[t + 1]
+                positions.append(np.arange(start, end))
+                rows.append(np.full(end - start, row, dtype=np.int64))
+
+        n_cells = len(term_ids) * self.n_docs
+        if not positions:
+            return np.zeros((len(term_ids), self.n_docs))
+        positions = np.concatenate(positions)
+        cells = np.concatenate(rows) * self.n_docs + self.indices[positions]
+        flat = np.bincount(cells, weights=self.data[positions], minlength=n_cells)
+        return flat.reshape(len(term_ids), self.n_docs)
+
+    def search_many(self, queries: Sequence[str], max_results: int = 5) -> List[List[Tuple[int, float]]]:
+        results = []
+        chunk = max(1, self.MAX_CELLS // max(self.n_docs, 1))
+        for offset in range(0, len(queries), chunk):
+            batch = [self.query_terms(q) for q in queries[offset:offset + chunk]]
+            scores = self.scores(batch)
+            k = min(max_results, self.n_docs)
+            if k <= 0:
+                results.extend([] for _ in batch)
+                continue
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            for row, candidates in enumerate(top):
+                ranked = sorted(candidates, key=lambda d: -scores[row, d])
+                results.append([(int(d), float(scores[row, d])) for d in ranked if scores[row, d] > 0])
+        return results
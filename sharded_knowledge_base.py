@@ -0,0 +1,221 @@
+"""
+Sharded Knowledge Base - Indexes a directory of sources (PDFs, man pages, docs, runbooks)
+into one PDFKnowledgeBase shard per file and merges their results
+"""
+import re
+import gzip
+import json
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from command_cache import CACHE_DIR
+from pdf_knowledge_base import (
+    DEFAULT_CONTEXT_TOKENS, PAGE_DIGEST_SIZE, PDFKnowledgeBase, command_name, pack_context
+)
+
+TEXT_PAGE_LINES = 60  # Pseudo-page size for sources without form feeds
+TEXT_SUFFIXES = {'.txt', '.md', '.rst', '.text', ''}
+MAN_PAGE_RE = re.compile(r"\.\d[a-z]*(\.gz)?$")
+WEIGHTS_FILE = "weights.json"  # Optional {"<source or top-level dir>": weight} in the sources dir
+MAX_SEARCH_THREADS = 8
+
+
+class TextKnowledgeBase(PDFKnowledgeBase):
+    """Knowledge base shard for plain text, Markdown and (optionally gzipped) man pages"""
+
+    def __init__(self, text_path: str, cache_dir: Optional[str] = None):
+        self.title = Path(text_path).name
+        self._pages: Optional[List[str]] = None
+        super().__init__(text_path, cache_dir)
+
+    def _read_pages(self) -> List[str]:
+        if self._pages is None:
+            opener = gzip.open if self.pdf_path.suffix == '.gz' else open
+            with opener(self.pdf_path, 'rt', encoding='utf-8', errors='replace') as f:
+                text = f.read()
+            if MAN_PAGE_RE.search(self.pdf_path.name) or text.startswith(('.TH', '.\\"')):
+                text = self._strip_roff(text)
+
+            if '\f' in text:
+                self._pages = text.split('\f')
+            else:
+                lines = text.splitlines()
+                self._pages = ["\n".join(lines[i:i + TEXT_PAGE_LINES])
+                               for i in range(0, len(lines), TEXT_PAGE_LINES)]
+        return self._pages
+
+    @staticmethod
+    def _strip_roff(text: str) -> str:
+        """Rough man page markup removal: drop comments, keep macro arguments, remove font escapes"""
+        lines = []
+        for line in text.splitlines():
+            if line.startswith(('.\\"', "'\\\"")):
+                continue
+            if line.startswith('.'):
+                line = line.split(None, 1)[1] if ' ' in line else ''
+            line = re.sub(r"\\f[BIRP]|\\f\(..|\\\(..|\\[&e]", "", line).replace('\\-', '-')
+            lines.append(line)
+        return "\n".join(lines)
+
+    def _page_count(self) -> int:
+        self._pages = None  # Re-read: the file may have changed since the last extraction
+        return len(self._read_pages())
+
+    def _read_page_hashes(self) -> bytes:
+        self._pages = None
+        return b"".join(hashlib.blake2b(page.encode('utf-8'), digest_size=PAGE_DIGEST_SIZE).digest()
+                        for page in self._read_pages())
+
+    def _extract_pages(self, indices: List[int]) -> Dict[int, Tuple[str, bytes]]:
+        pages = self._read_pages()
+        return {i: (pages[i], hashlib.blake2b(pages[i].encode('utf-8'), digest_size=PAGE_DIGEST_SIZE).digest())
+                for i in indices}
+
+
+class ShardedKnowledgeBase:
+    """
+    One knowledge base shard per source file, searched concurrently.
+
+    Shards keep their own caches, so adding a source only indexes that source.
+    Caches go under the user cache directory (sources may be read-only, like
+    /usr/share/doc); extra sources keep the cache next to them that
+    PDFKnowledgeBase uses on its own, so the Toolbox PDF is not re-extracted.
+    Each shard's BM25 scores are multiplied by its weight before the global
+    top-k merge; results carry a 'source' key naming the shard.
+    """
+
+    def __init__(self, sources_dir: str, extra_sources: Optional[List[str]] = None,
+                 weights: Optional[Dict[str, float]] = None, cache_dir: Optional[str] = None):
+        self.sources_dir = Path(sources_dir)
+        self.extra_sources = [Path(p) for p in extra_sources or [] if Path(p).exists()]
+        self.cache_dir = cache_dir or str(CACHE_DIR / "kb")
+        self.weights = self._load_weights()
+        self.weights.update(weights or {})
+        self.shards: Dict[str, PDFKnowledgeBase] = {}
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=MAX_SEARCH_THREADS, thread_name_prefix="kb-shard")
+        self.refresh()
+
+    def _load_weights(self) -> Dict[str, float]:
+        weights_path = self.sources_dir / WEIGHTS_FILE
+        if not weights_path.exists():
+            return {}
+        try:
+            with open(weights_path, 'r', encoding='utf-8') as f:
+                return {str(k): float(v) for k, v in json.load(f).items()}
+        except Exception as e:
+            print(f"⚠️  Could not read {weights_path}: {e}")
+            return {}
+
+    def _discover(self) -> Dict[str, Path]:
+        """Map shard names (paths relative to the sources dir) to source files"""
+        sources = {self._shard_name(path): path for path in self.extra_sources}
+        if self.sources_dir.is_dir():
+            for path in sorted(self.sources_dir.rglob('*')):
+                if not path.is_file() or any(part.startswith('.') for part in path.relative_to(self.sources_dir).parts):
+                    continue
+                if path.name == WEIGHTS_FILE:
+                    continue
+                suffix = path.suffix.lower()
+                if suffix == '.pdf' or suffix in TEXT_SUFFIXES or MAN_PAGE_RE.search(path.name) or suffix == '.gz':
+                    sources[self._shard_name(path)] = path
+        return sources
+
+    def _shard_name(self, path: Path) -> str:
+        try:
+            return str(path.relative_to(self.sources_dir))
+        except ValueError:
+            return path.name
+
+    def _open_shard(self, path: Path) -> Optional[PDFKnowledgeBase]:
+        cache_dir = None if path in self.extra_sources else self.cache_dir
+        try:
+            if path.suffix.lower() != '.pdf':
+                return TextKnowledgeBase(str(path), cache_dir)
+            shard = PDFKnowledgeBase(str(path), cache_dir)
+            if path not in self.extra_sources:
+                shard.title = path.stem
+            return shard
+        except Exception as e:
+            print(f"⚠️  Skipping source {path}: {e}")
+            return None
+
+    def refresh(self):
+        """Index sources added since the last refresh and drop removed ones; existing shards are kept"""
+        sources = self._discover()
+        with self._lock:
+            current = dict(self.shards)
+        new = {name: path for name, path in sources.items() if name not in current}
+
+        opened = dict(zip(new, self._pool.map(self._open_shard, new.values())))
+        with self._lock:
+            self.shards = {name: current.get(name) or opened.get(name)
+                           for name in sources if current.get(name) or opened.get(name)}
+        if new:
+            print(f"✅ Knowledge base: {len(self.shards)} sources ({len(new)} added)")
+
+    def add_source(self, path: str):
+        """Index one more source file without touching the existing shards"""
+        path = Path(path)
+        shard = self._open_shard(path)
+        if shard is not None:
+            with self._lock:
+                if self._shard_name(path) == path.name:  # Outside the sources dir: keep it across refreshes
+                    self.extra_sources.append(path)
+                self.shards[self._shard_name(path)] = shard
+
+    def weight(self, name: str) -> float:
+        """Weight of a shard: exact name, else its top-level directory, else 1.0"""
+        if name in self.weights:
+            return self.weights[name]
+        return self.weights.get(Path(name).parts[0], 1.0)
+
+    def _map_shards(self, fn) -> List[Tuple[str, object]]:
+        """Run fn(shard) on every shard concurrently, returning (name, result) in shard order"""
+        with self._lock:
+            shards = list(self.shards.items())
+        results = self._pool.map(lambda item: fn(item[1]), shards)
+        return [(name, result) for (name, _), result in zip(shards, results)]
+
+    def _merge(self, per_shard: List[Tuple[str, List[Dict]]], max_results: int) -> List[Dict]:
+        merged = []
+        for name, results in per_shard:
+            weight = self.weight(name)
+            # Copy: shard results are shared with the shard's query cache
+            merged.extend({**r, 'source': name, 'score': r['score'] * weight} for r in results)
+        merged.sort(key=lambda r: r['score'], reverse=True)
+        return merged[:max_results]
+
+    def search(self, query: str, max_results: int = 5) -> List[Dict]:
+        return self._merge(self._map_shards(lambda kb: kb.search(query, max_results)), max_results)
+
+    def search_passages(self, query: str, max_results: int = 5) -> List[Dict]:
+        return self._merge(self._map_shards(lambda kb: kb.search_passages(query, max_results)), max_results)
+
+    def search_many(self, queries: List[str], max_results: int = 5) -> List[List[Dict]]:
+        per_shard = self._map_shards(lambda kb: kb.search_many(queries, max_results))
+        return [
+            self._merge([(name, results[i]) for name, results in per_shard], max_results)
+            for i in range(len(queries))
+        ]
+
+    def _title(self, source: str) -> str:
+        shard = self.shards.get(source)
+        return shard.title if shard is not None else source
+
+    def get_command_context(self, command: str, token_budget: int = DEFAULT_CONTEXT_TOKENS) -> str:
+        """The best documented reference section for the command's program across all sources"""
+        name = command_name(command)
+        best = None
+        for source, results in self._map_shards(lambda kb: kb.lookup_command(name, max_results=1)):
+            if results and (best is None or results[0]['count'] * self.weight(source) > best['score']):
+                best = {**results[0], 'source': source, 'title': self._title(source),
+                        'score': results[0]['count'] * self.weight(source)}
+        return pack_context([best] if best else [], token_budget)
+
+    def get_context(self, query: str, token_budget: int = DEFAULT_CONTEXT_TOKENS) -> str:
+        """Get relevant context for a query from the best passages across all sources"""
+        candidates = self.search_passages(query, max_results=token_budget // 50 + 2)
+        return pack_context([{**c, 'title': self._title(c['source'])} for c in candidates], token_budget)
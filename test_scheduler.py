@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Quick test of read-only command classification
+"""
+from scheduler import is_read_only
+
+# (command, read-only?)
+test_commands = [
+    ("df -h", True),
+    ("free -h && uptime", True),
+    ("ps aux | grep ssh | sort | uniq -c", True),
+    ("cat /etc/os-release 2>/dev/null", True),
+    ("sudo apt update", False),
+    ("echo hi > notes.txt", False),
+    # Wrappers run the program after them
+    ("env", True),
+    ("env LANG=C df -h", True),
+    ("env rm -rf /tmp/x", False),
+    ("env apt-get install -y vim", False),
+    # Read-only programs with mutating arguments
+    ("sed 's/a/b/' notes.txt", True),
+    ("sed -i 's/a/b/' notes.txt", False),
+    ("sed -Ei 's/a/b/' notes.txt", False),
+    ("sed -ri 's/a/b/' notes.txt", False),
+    ("sed -ni 'p' notes.txt", False),
+    ("sed --in-place=.bak 's/a/b/' notes.txt", False),
+    ("sort names.txt", True),
+    ("sort -o names.txt names.txt", False),
+    ("sort -uo names.txt names.txt", False),
+    ("sort --output=sorted.txt names.txt", False),
+    ("uniq -c names.txt", True),
+    ("uniq names.txt unique.txt", False),
+    ("journalctl -u ssh --no-pager", True),
+    ("journalctl --vacuum-size=100M", False),
+    ("dmesg -T", True),
+    ("dmesg -c", False),
+    ("awk -F: '{print $1}' /etc/passwd", True),
+    ("awk '{system(\"rm x\")}' f", False),
+    ("awk '{print > \"out\"}' f", False),
+]
+
+if __name__ == "__main__":
+    print("Testing read-only classification...\n")
+
+    failures = 0
+    for command, expected in test_commands:
+        result = is_read_only(command)
+        if result != expected:
+            failures += 1
+            print(f"❌ {command!r}: expected {'read-only' if expected else 'mutating'}")
+
+    if failures:
+        print(f"\n❌ {failures} test(s) failed")
+    else:
+        print(f"✅ All {len(test_commands)} tests passed!")